@@ -1,50 +1,79 @@
 # main.py
 
-from fastapi import FastAPI, HTTPException, status, Security, Depends
-from fastapi.security import HTTPBasic, HTTPBasicCredentials
-from pydantic import BaseModel, Field, model_validator
-from typing import Dict, List, Optional, Any
-from contextlib import asynccontextmanager
-import json
+from fastapi import FastAPI, HTTPException, status, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBasic, HTTPBasicCredentials, HTTPBearer
+from pydantic import BaseModel, Field
+from typing import Annotated, Dict, List, Optional
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timedelta, timezone
+import anyio
+import asyncio
+import bisect
+import hashlib
+import hmac
+import logging
+import logging.handlers
+import math
 import os
-from colorama import Fore, Style, init 
+import queue
+import secrets
+import tempfile
+import threading
+import time
 from passlib.context import CryptContext
+from jose import JWTError, jwt
+import orjson
 
-# Initialize colorama
-init(autoreset=True)
+logger = logging.getLogger(__name__)
 
 # --- Constants ---
 STUDENTS_FILE = "students.json"
+# Bump whenever the Student schema changes, so files written by older code are re-validated.
+STUDENTS_SCHEMA_VERSION = 2
+SAVE_DEBOUNCE_SECONDS = 0.1
+# Students serialized per chunk when streaming GET /students/.
+STREAM_CHUNK_SIZE = 100
+# bcrypt cost factor; 12 suits production, while tests and local dev can drop to 4.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Worker threads for sync dependencies and offloaded bcrypt calls (anyio's default is 40).
+THREADPOOL_SIZE = 200
+# Tokens are signed with SECRET_KEY; without one, a random key is used and tokens end with the process.
+SECRET_KEY = os.getenv("SECRET_KEY") or secrets.token_urlsafe(32)
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+AUTH_CACHE_TTL_SECONDS = 60
+AUTH_CACHE_MAX_SIZE = 10000
+# Mutations of one username are serialized; different usernames rarely share a lock.
+STUDENT_LOCK_SHARDS = 32
 
 # --- Pydantic Models ---
+def new_token_version() -> str:
+    return secrets.token_hex(8)
+
+# Range-checked by pydantic-core while the request body is parsed.
+Score = Annotated[float, Field(ge=0, le=100)]
+
 class StudentBase(BaseModel):
     """Base model for creating or updating a student."""
     name: str = Field(..., min_length=1)
-    subject_scores: Dict[str, float] = Field(...)
+    subject_scores: Dict[str, Score] = Field(...)
 
-    @model_validator(mode='after')
-    def validate_scores(self):
-        for subject, score in self.subject_scores.items():
-            if not (0 <= score <= 100):
-                raise ValueError(f"Score for {subject} must be between 0 and 100.")
-        return self
-
-class Student(StudentBase):
-    """Full student model with authentication details, role, and calculated grades."""
+class StudentPublic(StudentBase):
+    """Student profile as returned by the API, without authentication details."""
     username: str
-    hashed_password: str
     role: str = "student"
     average: float = Field(...)
     grade: str = Field(...)
 
-class StudentPublic(BaseModel):
-    """Public-facing student model for API responses (excludes sensitive data)."""
-    username: str
-    name: str
-    subject_scores: Dict[str, float] = {}
-    average: float = Field(...)
-    grade: str = Field(...)
-    role: str = "student"
+class Student(StudentPublic):
+    """Full student model with authentication details, role, and calculated grades."""
+    hashed_password: str
+    # Carried in bearer tokens; replacing it revokes every token issued before. Random, so a
+    # deleted username that is registered again doesn't accept the old account's tokens.
+    token_version: str = Field(default_factory=new_token_version)
 
 class StudentLogin(BaseModel):
     """Model for student registration/login"""
@@ -53,14 +82,7 @@ class StudentLogin(BaseModel):
 
 class GradeUpdate(BaseModel):
     """Model for updating a student's grades."""
-    subject_scores: Dict[str, float] = Field(...)
-
-    @model_validator(mode='after')
-    def validate_scores(self):
-        for subject, score in self.subject_scores.items():
-            if not (0 <= score <= 100):
-                raise ValueError(f"Score for {subject} must be between 0 and 100.")
-        return self
+    subject_scores: Dict[str, Score] = Field(...)
 
 class SubjectSummary(BaseModel):
     total_students: int
@@ -70,13 +92,26 @@ class GradesSummary(BaseModel):
     overall_average: float
     subject_averages: Dict[str, SubjectSummary]
 
+class Token(BaseModel):
+    """Bearer token returned by /login/."""
+    access_token: str
+    token_type: str = "bearer"
+
 class PasswordChange(BaseModel):
     old_password: str
     new_password: str = Field(..., min_length=6)
 
 # --- Password Hashing and Security ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=BCRYPT_ROUNDS, deprecated="auto")
 security = HTTPBasic()
+# auto_error=False so a missing header gets the same 401 as a bad token, not HTTPBearer's 403.
+bearer_scheme = HTTPBearer(auto_error=False)
+
+# Verified against when the username doesn't exist, so that path costs the same bcrypt
+# round as a wrong password and response time doesn't reveal which usernames are taken.
+# Hashing it here also makes passlib resolve its bcrypt backend at import time rather
+# than on the first login.
+_DUMMY_HASH = pwd_context.hash("dummy")
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -84,25 +119,106 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+# Recent bcrypt results, keyed by sha256("username:password") -> (expires_at, hash, result, username).
+# Failed attempts are cached too, so repeated bad guesses don't each cost a bcrypt round.
+# An entry only counts while the stored hash still matches the one it was checked against.
+_auth_cache: Dict[bytes, tuple[float, str, bool, str]] = {}
+_auth_cache_keys: Dict[str, set[bytes]] = {}
+_auth_cache_lock = threading.Lock()
+
+def _forget_cache_key(key: bytes) -> None:
+    _, _, _, username = _auth_cache.pop(key)
+    keys = _auth_cache_keys.get(username)
+    if keys is not None:
+        keys.discard(key)
+        if not keys:
+            del _auth_cache_keys[username]
+
+def _verify_cached(username: str, password: str, hashed_password: str) -> bool:
+    """Verifies a password, reusing a recent result for the same credentials."""
+    key = hashlib.sha256(f"{username}:{password}".encode()).digest()
+    now = time.monotonic()
+    with _auth_cache_lock:
+        cached = _auth_cache.get(key)
+        if (
+            cached
+            and cached[0] > now
+            and hmac.compare_digest(cached[1].encode(), hashed_password.encode())
+        ):
+            return cached[2]
+
+    result = verify_password(password, hashed_password)
+
+    with _auth_cache_lock:
+        if key not in _auth_cache and len(_auth_cache) >= AUTH_CACHE_MAX_SIZE:
+            _forget_cache_key(next(iter(_auth_cache)))
+        _auth_cache[key] = (now + AUTH_CACHE_TTL_SECONDS, hashed_password, result, username)
+        _auth_cache_keys.setdefault(username, set()).add(key)
+    return result
+
+def invalidate_cached_credentials(username: str) -> None:
+    """Drops any cached verification results for a user."""
+    with _auth_cache_lock:
+        for key in _auth_cache_keys.pop(username, set()):
+            _auth_cache.pop(key, None)
+
+def normalize_username(username: str) -> str:
+    """Canonical form used for students_db keys and Student.username."""
+    return username.lower()
+
 def get_students_db() -> Dict[str, Student]:
     """Dependency to load the database for each request."""
     return students_db
 
-def get_authenticated_user(
+def create_access_token(student: Student) -> str:
+    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    return jwt.encode(
+        {"sub": student.username, "ver": student.token_version, "exp": expire},
+        SECRET_KEY,
+        algorithm=ALGORITHM,
+    )
+
+def get_basic_user(
     credentials: HTTPBasicCredentials = Depends(security),
     db: Dict[str, Student] = Depends(get_students_db)
 ) -> Student:
-    """Authenticates a user and returns the student object."""
-    student = db.get(credentials.username)
-    if not student or not verify_password(credentials.password, student.hashed_password):
+    """Authenticates a username and password; only /login/ pays for bcrypt."""
+    username = normalize_username(credentials.username)
+    student = db.get(username)
+    hashed_password = student.hashed_password if student else _DUMMY_HASH
+    verified = _verify_cached(username, credentials.password, hashed_password)
+    if not student or not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
         )
     return student
 
+def get_authenticated_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+    db: Dict[str, Student] = Depends(get_students_db)
+) -> Student:
+    """Authenticates a bearer token issued by /login/ and returns the student object."""
+    payload = {}
+    if credentials is not None:
+        try:
+            payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            pass
+    student = db.get(payload.get("sub", ""))
+    if student is None or not hmac.compare_digest(
+        str(payload.get("ver", "")).encode(), student.token_version.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return student
+
 def get_current_admin(student: Student = Depends(get_authenticated_user)) -> Student:
     """Authenticates a user and checks if they are an admin."""
+    # Roles are not secret, so a plain comparison is fine here.
     if student.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -112,40 +228,122 @@ def get_current_admin(student: Student = Depends(get_authenticated_user)) -> Stu
 
 # --- Database and Utility Functions ---
 students_db: Dict[str, Student] = {}
+# asyncio locks rather than thread locks: endpoints hold them across awaited bcrypt calls.
+_student_locks = [asyncio.Lock() for _ in range(STUDENT_LOCK_SHARDS)]
+
+def student_lock(username: str) -> asyncio.Lock:
+    """Returns the lock guarding mutations of the given (normalized) username."""
+    return _student_locks[hash(username) % STUDENT_LOCK_SHARDS]
+
+# Set when an unreadable students.json couldn't be moved aside; saving would overwrite it.
+_saving_disabled = False
 
 def load_students_data() -> None:
-    global students_db
+    global students_db, _saving_disabled
     if os.path.exists(STUDENTS_FILE):
         try:
-            with open(STUDENTS_FILE, "r") as f:
-                data = json.load(f)
-                students_db = {
-                    name: Student(**student_data)
-                    for name, student_data in data.items()
-                }
-            print(f"{Fore.GREEN}INFO: Loaded {len(students_db)} students{Style.RESET_ALL}")
+            with open(STUDENTS_FILE, "rb") as f:
+                data = orjson.loads(f.read())
+            students_db = {}
+            # Untagged legacy files are keyed by username, and "version" is a valid username,
+            # so only this exact shape counts as a tagged file.
+            tagged = (
+                data.keys() == {"version", "students"}
+                and type(data["version"]) is int
+                and isinstance(data["students"], dict)
+            )
+            if tagged and data["version"] == STUDENTS_SCHEMA_VERSION:
+                # Written by this schema version, so the data is already valid and normalized.
+                for username, student_data in data["students"].items():
+                    students_db[username] = Student.model_construct(**student_data)
+            else:
+                # Older schema versions and untagged legacy files are validated row by row.
+                rows = data["students"] if tagged else data
+                for student_data in rows.values():
+                    student = Student(**student_data)
+                    # Older files may hold mixed-case usernames; fold them onto the canonical key.
+                    username = normalize_username(student.username)
+                    if username in students_db:
+                        # Keep the first account rather than silently replacing it.
+                        logger.error(
+                            "Skipping student '%s': username clashes with an earlier account.",
+                            student.username
+                        )
+                        continue
+                    student.username = username
+                    students_db[username] = student
+            logger.info("Loaded %d students", len(students_db))
         except Exception as e:
-            print(f"{Fore.RED}ERROR loading data: {e}{Style.RESET_ALL}")
+            # Moved aside so the next save can't overwrite the only copy of the data.
+            backup_file = f"{STUDENTS_FILE}.{int(time.time())}.bak"
+            try:
+                os.replace(STUDENTS_FILE, backup_file)
+                logger.error("Error loading data: %s; moved the file to %s", e, backup_file)
+            except OSError as move_error:
+                _saving_disabled = True
+                logger.error(
+                    "Error loading data: %s; could not move the file aside (%s), so changes won't be saved",
+                    e, move_error
+                )
             students_db = {}
-
-def save_students_data() -> None:
+    rebuild_summary()
+
+# Set by mutating endpoints; the flush worker started in lifespan coalesces them into one write.
+_students_dirty: Optional[asyncio.Event] = None
+_save_lock = threading.Lock()
+
+def _snapshot_students() -> bytes:
+    # pydantic-core writes each student straight to JSON bytes, so no intermediate dicts are built.
+    to_json = Student.__pydantic_serializer__.to_json
+    return b'{"version":%d,"students":{' % STUDENTS_SCHEMA_VERSION + b",".join(
+        orjson.dumps(name) + b":" + to_json(student)
+        for name, student in students_db.items()
+    ) + b"}}"
+
+def _write_students_file(payload: bytes) -> None:
+    """Swaps a new snapshot in for STUDENTS_FILE, which is never left half-written."""
+    if _saving_disabled:
+        return
     try:
-        with open(STUDENTS_FILE, "w") as f:
-            json.dump(
-                {name: student.model_dump() for name, student in students_db.items()},
-                f, indent=4
-            )
+        with _save_lock:
+            fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(STUDENTS_FILE) or ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(payload)
+                os.replace(tmp_file, STUDENTS_FILE)
+            except BaseException:
+                with suppress(OSError):
+                    os.remove(tmp_file)
+                raise
     except Exception as e:
-        print(f"{Fore.RED}ERROR saving data: {e}{Style.RESET_ALL}")
+        logger.error("Error saving data: %s", e)
+
+def save_students_data() -> None:
+    _write_students_file(_snapshot_students())
+
+def mark_students_dirty() -> None:
+    """Schedules a save; writes immediately if the flush worker isn't running."""
+    if _students_dirty is None:
+        save_students_data()
+    else:
+        _students_dirty.set()
+
+async def _flush_worker() -> None:
+    while True:
+        await _students_dirty.wait()
+        await asyncio.sleep(SAVE_DEBOUNCE_SECONDS)
+        _students_dirty.clear()
+        # Snapshot on the event loop so the thread never sees students_db mid-mutation.
+        await asyncio.to_thread(_write_students_file, _snapshot_students())
+
+# Lower bound of each band above F; bisect_right picks the band an average falls in.
+GRADE_THRESHOLDS = (60, 70, 80, 90)
+GRADE_LETTERS = ("F", "D", "C", "B", "A")
 
 def calculate_average_and_grade(scores: Dict[str, float]) -> tuple[float, str]:
     if not scores: return 0.0, "N/A"
-    average = sum(scores.values()) / len(scores)
-    if average >= 90: return round(average, 2), "A"
-    elif average >= 80: return round(average, 2), "B"
-    elif average >= 70: return round(average, 2), "C"
-    elif average >= 60: return round(average, 2), "D"
-    return round(average, 2), "F"
+    average = math.fsum(scores.values()) / len(scores)
+    return round(average, 2), GRADE_LETTERS[bisect.bisect_right(GRADE_THRESHOLDS, average)]
 
 def create_initial_admin() -> None:
     admin_username = "admin"
@@ -163,34 +361,59 @@ def create_initial_admin() -> None:
         )
         students_db[admin_username] = admin_user
         save_students_data()
-        print(f"{Fore.YELLOW}WARNING: Default admin user '{admin_username}' created with password '{admin_password}'.{Style.RESET_ALL}")
+        logger.warning("Default admin user '%s' created with password '%s'.", admin_username, admin_password)
+
+# Running totals behind the grades summary, updated as students are added, changed or removed.
+_subject_sum: defaultdict[str, float] = defaultdict(float)
+_subject_count: Counter[str] = Counter()
+_overall_sum = 0.0
+_students_with_grades = 0
+
+def apply_to_summary(student: Student, sign: int = 1) -> None:
+    """Adds (sign=1) or removes (sign=-1) a student's scores from the running totals."""
+    global _overall_sum, _students_with_grades
+    if not student.subject_scores:
+        return
+
+    _students_with_grades += sign
+    _overall_sum = _overall_sum + sign * student.average if _students_with_grades else 0.0
+    for subject, score in student.subject_scores.items():
+        _subject_count[subject] += sign
+        if _subject_count[subject]:
+            _subject_sum[subject] += sign * score
+        else:
+            del _subject_count[subject]
+            del _subject_sum[subject]
+
+def rebuild_summary() -> None:
+    """Recomputes the running totals from scratch, e.g. after loading from disk."""
+    global _overall_sum, _students_with_grades
+    graded = [student for student in students_db.values() if student.subject_scores]
+    # Group the scores once, then reduce each group with a single fsum instead of
+    # updating the totals score by score.
+    scores_by_subject: defaultdict[str, List[float]] = defaultdict(list)
+    for student in graded:
+        for subject, score in student.subject_scores.items():
+            scores_by_subject[subject].append(score)
+
+    _subject_sum.clear()
+    _subject_count.clear()
+    for subject, scores in scores_by_subject.items():
+        _subject_sum[subject] = math.fsum(scores)
+        _subject_count[subject] = len(scores)
+    _overall_sum = math.fsum(student.average for student in graded)
+    _students_with_grades = len(graded)
 
 def generate_grades_summary() -> GradesSummary:
     """Generates a comprehensive summary of all student grades."""
-    if not students_db:
-        return GradesSummary(overall_average=0.0, subject_averages={})
-        
-    total_students_with_grades = 0
-    total_all_scores = 0.0
-    subject_scores_sum: Dict[str, float] = {}
-    subject_student_count: Dict[str, int] = {}
-
-    for student in students_db.values():
-        if student.subject_scores:
-            total_students_with_grades += 1
-            total_all_scores += student.average
-            for subject, score in student.subject_scores.items():
-                subject_scores_sum[subject] = subject_scores_sum.get(subject, 0.0) + score
-                subject_student_count[subject] = subject_student_count.get(subject, 0) + 1
-
-    overall_average = total_all_scores / total_students_with_grades if total_students_with_grades > 0 else 0.0
+    overall_average = _overall_sum / _students_with_grades if _students_with_grades > 0 else 0.0
 
     subject_averages = {
         subject: SubjectSummary(
-            total_students=subject_student_count[subject],
-            average_score=subject_scores_sum[subject] / subject_student_count[subject]
+            total_students=count,
+            average_score=_subject_sum[subject] / count
         )
-        for subject in subject_scores_sum
+        for subject, count in _subject_count.items()
     }
 
     return GradesSummary(
@@ -198,14 +421,51 @@ def generate_grades_summary() -> GradesSummary:
         subject_averages=subject_averages
     )
 
+def stream_students(students: List[Student]):
+    """Yields the students' public profiles as a JSON array, STREAM_CHUNK_SIZE at a time."""
+    # StudentPublic's serializer writes only its own fields, leaving out authentication details.
+    to_json = StudentPublic.__pydantic_serializer__.to_json
+    yield b"["
+    for start in range(0, len(students), STREAM_CHUNK_SIZE):
+        chunk = b",".join(
+            to_json(student)
+            for student in students[start:start + STREAM_CHUNK_SIZE]
+        )
+        yield chunk if start == 0 else b"," + chunk
+    yield b"]"
+
 # --- FastAPI App ---
+def start_logging() -> logging.handlers.QueueListener:
+    """Routes this module's logs through a queue so request handlers never block on stdout."""
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    return listener
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print(f"{Fore.MAGENTA}Starting up...{Style.RESET_ALL}")
+    global _students_dirty
+    log_listener = start_logging()
+    logger.info("Starting up...")
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
     load_students_data()
     create_initial_admin()
+    _students_dirty = asyncio.Event()
+    flush_task = asyncio.create_task(_flush_worker())
     yield
-    print(f"{Fore.MAGENTA}Shutting down...{Style.RESET_ALL}")
+    logger.info("Shutting down...")
+    flush_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await flush_task
+    _students_dirty = None
+    save_students_data()
+    log_listener.stop()
+    logger.handlers.clear()
 
 app = FastAPI(
     title="Student Portal API",
@@ -220,39 +480,48 @@ async def register_student(student_login: StudentLogin, db: Dict[str, Student] =
     """
     Registers a new student user with a unique username and password.
     """
-    if student_login.username in db:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Username already registered"
+    username = normalize_username(student_login.username)
+    async with student_lock(username):
+        if username in db:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Username already registered"
+            )
+        
+        # Hashing is slow, so it runs in the threadpool.
+        hashed_password = await run_in_threadpool(hash_password, student_login.password)
+        
+        new_student = Student(
+            username=username,
+            hashed_password=hashed_password,
+            name=student_login.username,
+            role="student",
+            subject_scores={},
+            average=0.0,
+            grade="N/A"
         )
-    
-    hashed_password = hash_password(student_login.password)
-    
-    new_student = Student(
-        username=student_login.username,
-        hashed_password=hashed_password,
-        name=student_login.username,
-        role="student",
-        subject_scores={},
-        average=0.0,
-        grade="N/A"
-    )
-    
-    db[student_login.username] = new_student
-    save_students_data()
-    print(f"{Fore.GREEN}INFO: Student '{student_login.username}' registered successfully.{Style.RESET_ALL}")
+        
+        db[username] = new_student
+        mark_students_dirty()
+    logger.info("Student '%s' registered successfully.", username)
     
     return {"message": "Registration successful"}
 
-@app.post("/login/", summary="Log in a student")
-async def login(student: Student = Depends(get_authenticated_user)):
+@app.post("/login/", summary="Log in a student and get a bearer token")
+async def login(student: Student = Depends(get_basic_user)):
     """
-    Authenticates a user and confirms successful login.
+    Authenticates a user with HTTP Basic credentials and returns a short-lived bearer token
+    to use on every other endpoint.
     """
-    print(f"{Fore.GREEN}INFO: Student '{student.username}' logged in successfully.{Style.RESET_ALL}")
-    return {"message": "Login successful!"}
+    logger.info("Student '%s' logged in successfully.", student.username)
+    token = Token(access_token=create_access_token(student))
+    return {"message": "Login successful!", **token.model_dump()}
 
-@app.get("/grades/", response_model=StudentPublic, summary="Get grades for the authenticated student")
+@app.get(
+    "/grades/",
+    response_model=StudentPublic,
+    summary="Get grades for the authenticated student"
+)
 async def get_grades(student: Student = Depends(get_authenticated_user)):
     """
     Retrieves the grades and profile information for the currently logged-in student.
@@ -267,18 +536,22 @@ async def change_password(
     """
     Allows a logged-in student to change their password by providing their old and new passwords.
     """
-    # Verify the old password
-    if not verify_password(passwords.old_password, current_user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect old password"
-        )
-    
-    # Hash and save the new password
-    current_user.hashed_password = hash_password(passwords.new_password)
-    save_students_data()
+    async with student_lock(current_user.username):
+        # Verify the old password
+        if not await run_in_threadpool(verify_password, passwords.old_password, current_user.hashed_password):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Incorrect old password"
+            )
+        
+        # Hash and save the new password
+        current_user.hashed_password = await run_in_threadpool(hash_password, passwords.new_password)
+        # Tokens issued before the change stop working.
+        current_user.token_version = new_token_version()
+        invalidate_cached_credentials(current_user.username)
+        mark_students_dirty()
     
-    print(f"{Fore.GREEN}INFO: Password for '{current_user.username}' changed successfully.{Style.RESET_ALL}")
+    logger.info("Password for '%s' changed successfully.", current_user.username)
     return {"message": "Password changed successfully"}
 
 @app.put(
@@ -293,22 +566,26 @@ async def update_grades(
     db: Dict[str, Student] = Depends(get_students_db),
     admin_user: Student = Depends(get_current_admin)
 ):
-    student = db.get(username)
-    if not student:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Student not found"
-        )
-    
-    student.subject_scores.update(grade_update.subject_scores)
-    
-    avg, grade = calculate_average_and_grade(student.subject_scores)
-    student.average = avg
-    student.grade = grade
-    
-    save_students_data()
+    name_lower = normalize_username(username)
+    async with student_lock(name_lower):
+        student = db.get(name_lower)
+        if not student:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Student not found"
+            )
+        
+        apply_to_summary(student, -1)
+        student.subject_scores.update(grade_update.subject_scores)
+        
+        avg, grade = calculate_average_and_grade(student.subject_scores)
+        student.average = avg
+        student.grade = grade
+        apply_to_summary(student)
+        
+        mark_students_dirty()
 
-    print(f"{Fore.GREEN}INFO: Admin '{admin_user.username}' updated grades for '{username}'.{Style.RESET_ALL}")
+    logger.info("Admin '%s' updated grades for '%s'.", admin_user.username, username)
     return student
 
 @app.get(
@@ -332,22 +609,26 @@ async def create_student(
     db: Dict[str, Student] = Depends(get_students_db),
     admin_user: Student = Depends(get_current_admin)
 ):
-    name_lower = student_data.name.lower()
-    if name_lower in db:
-        raise HTTPException(409, detail="Student already exists")
-    
-    avg, grade = calculate_average_and_grade(student_data.subject_scores)
-    student = Student(
-        username=name_lower,
-        hashed_password=hash_password("defaultpassword"),
-        name=student_data.name,
-        role="student",
-        subject_scores=student_data.subject_scores,
-        average=avg,
-        grade=grade
-    )
-    db[name_lower] = student
-    save_students_data()
+    name_lower = normalize_username(student_data.name)
+    async with student_lock(name_lower):
+        if name_lower in db:
+            raise HTTPException(409, detail="Student already exists")
+        
+        hashed_password = await run_in_threadpool(hash_password, "defaultpassword")
+
+        avg, grade = calculate_average_and_grade(student_data.subject_scores)
+        student = Student(
+            username=name_lower,
+            hashed_password=hashed_password,
+            name=student_data.name,
+            role="student",
+            subject_scores=student_data.subject_scores,
+            average=avg,
+            grade=grade
+        )
+        db[name_lower] = student
+        apply_to_summary(student)
+        mark_students_dirty()
     return student
 
 @app.get(
@@ -361,13 +642,14 @@ async def get_student(
     db: Dict[str, Student] = Depends(get_students_db),
     current_user: Student = Depends(get_authenticated_user)
 ):
-    if current_user.role != "admin" and current_user.username != name:
+    name_lower = normalize_username(name)
+    if current_user.role != "admin" and current_user.username != name_lower:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You do not have permission to view this student's profile."
         )
 
-    if (student := db.get(name.lower())) is None:
+    if (student := db.get(name_lower)) is None:
         raise HTTPException(404, detail="Student not found")
     return student
 
@@ -381,7 +663,8 @@ async def get_all_students(
     db: Dict[str, Student] = Depends(get_students_db),
     admin_user: Student = Depends(get_current_admin)
 ):
-    return list(db.values())
+    # Streamed so serialization interleaves with sending instead of building one big body.
+    return StreamingResponse(stream_students(list(db.values())), media_type="application/json")
 
 @app.put(
     "/students/{name}",
@@ -395,20 +678,22 @@ async def update_student(
     db: Dict[str, Student] = Depends(get_students_db),
     admin_user: Student = Depends(get_current_admin)
 ):
-    name_lower = name.lower()
-    if name_lower not in db:
-        raise HTTPException(404, detail="Student not found")
-    if student_data.name.lower() != name_lower:
-        raise HTTPException(400, detail="Name mismatch")
-    
-    avg, grade = calculate_average_and_grade(student_data.subject_scores)
-    student = db[name_lower]
-    student.subject_scores = student_data.subject_scores
-    student.average = avg
-    student.grade = grade
-    
-    db[name_lower] = student
-    save_students_data()
+    name_lower = normalize_username(name)
+    async with student_lock(name_lower):
+        if name_lower not in db:
+            raise HTTPException(404, detail="Student not found")
+        if normalize_username(student_data.name) != name_lower:
+            raise HTTPException(400, detail="Name mismatch")
+        
+        avg, grade = calculate_average_and_grade(student_data.subject_scores)
+        student = db[name_lower]
+        apply_to_summary(student, -1)
+        student.subject_scores = student_data.subject_scores
+        student.average = avg
+        student.grade = grade
+        apply_to_summary(student)
+        
+        mark_students_dirty()
     return student
 
 @app.delete(
@@ -422,8 +707,11 @@ async def delete_student(
     db: Dict[str, Student] = Depends(get_students_db),
     admin_user: Student = Depends(get_current_admin)
 ):
-    if (name_lower := name.lower()) not in db:
-        raise HTTPException(404, detail="Student not found")
-    del db[name_lower]
-    save_students_data()
+    name_lower = normalize_username(name)
+    async with student_lock(name_lower):
+        if name_lower not in db:
+            raise HTTPException(404, detail="Student not found")
+        apply_to_summary(db.pop(name_lower), -1)
+        invalidate_cached_credentials(name_lower)
+        mark_students_dirty()
     return None
\ No newline at end of file
@@ -1,13 +1,21 @@
 # main.py
 
 from fastapi import FastAPI, HTTPException, status, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel, Field
-from typing import Dict, List, Optional
-from contextlib import asynccontextmanager
-import json
+from typing import Any, DefaultDict, Deque, Dict, List, Optional
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager, suppress
+import asyncio
+import logging
+import logging.handlers
+import math
 import os
+import queue
+import tempfile
 import time
-from colorama import Fore, Style, init
+import orjson
 
 # Import authentication and user models
 from auth import (
@@ -19,14 +27,25 @@ from auth import (
     users_db
 )
 
-# Initialize colorama
-init(autoreset=True)
+logger = logging.getLogger("shop")
 
 # --- Constants ---
 PRODUCTS_FILE = "products.json"
 CART_FILE = "cart.json"
+USERS_FILE = "users.json"
+# Changes made since the last snapshot of the files above.
+CHANGE_LOG_FILE = "changes.log"
+# How long the log writer waits for more changes before writing a batch.
+LOG_FLUSH_DELAY_SECONDS = 0.05
+# Once the change log grows past this, it is folded into fresh snapshots and emptied.
+LOG_COMPACT_BYTES = 1_000_000
 LOGIN_LIMIT = 5
 LOGIN_WINDOW_SECONDS = 60
+# How often IPs with no attempts left in the window are dropped from request_counts.
+RATE_LIMIT_PRUNE_SECONDS = 300
+LOG_FILE = "shop.log"
+LOG_MAX_BYTES = 1_000_000
+LOG_BACKUP_COUNT = 3
 
 # --- Pydantic Models for Shopping API ---
 class ProductBase(BaseModel):
@@ -38,70 +57,325 @@ class ProductBase(BaseModel):
 
 class Product(ProductBase):
     """Full product model with a unique ID."""
-    id: str
+    id: int
 
 class CartItem(BaseModel):
     """Model for an item in a user's cart."""
-    product_id: str
+    product_id: int
     quantity: int = Field(..., gt=0)
 
 class Cart(BaseModel):
-    """Model representing a user's shopping cart."""
+    """Model representing a user's shopping cart, mapping each product ID to its quantity."""
+    items: Dict[int, int] = {}
+
+class CartResponse(BaseModel):
+    """Model for a user's cart as returned by the API."""
     items: List[CartItem] = []
 
 # --- Database Mock-ups ---
-products_db: Dict[str, Product] = {}
+# Indexed by product ID; slot 0 is unused so IDs start at 1, and deleted products leave
+# a None behind so their IDs are never handed out again.
+products_db: List[Optional[Product]] = [None]
 carts_db: Dict[str, Cart] = {}
-request_counts: Dict[str, List[float]] = {}
+# Login attempt times per IP, oldest first.
+request_counts: DefaultDict[str, Deque[float]] = defaultdict(deque)
+# Serialized bodies of GET /products/ and GET /products/{id}, rebuilt on the first request
+# after the products they cover change. The per-product bodies are reused for snapshots.
+_products_body: Optional[bytes] = None
+_product_bodies: Dict[int, bytes] = {}
+
+def invalidate_products_cache(*product_ids: int) -> None:
+    """Drops the cached listing and the given products' cached bodies (all of them if none are given)."""
+    global _products_body
+    _products_body = None
+    if not product_ids:
+        _product_bodies.clear()
+    for product_id in product_ids:
+        _product_bodies.pop(product_id, None)
+
+def product_body(product: Product) -> bytes:
+    """Returns the product's JSON encoding, serializing it only if it changed since last time."""
+    body = _product_bodies.get(product.id)
+    if body is None:
+        body = _product_bodies[product.id] = orjson.dumps(product.__dict__)
+    return body
+
+def get_product_by_id(product_id: int) -> Optional[Product]:
+    """Returns the product with the given ID, or None if it doesn't exist."""
+    return products_db[product_id] if 0 < product_id < len(products_db) else None
+
+def reserve_product_slot(product_id: int) -> None:
+    """Grows products_db so the given ID has a slot, leaving new slots empty."""
+    if product_id >= len(products_db):
+        products_db.extend([None] * (product_id + 1 - len(products_db)))
+
+def store_product(product: Product) -> None:
+    """Puts a product in its ID's slot, growing the list if needed."""
+    reserve_product_slot(product.id)
+    products_db[product.id] = product
 
 # --- Utility Functions for Data Persistence ---
+class PersistenceLog:
+    """
+    Append-only log of changes made since the last snapshot.
+
+    Each record is one JSON line holding the full new state of a single product, cart or user,
+    so a change costs one small append and replaying a record twice is harmless.
+    While the writer task runs, records are buffered and written in batches off the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+        self.size = 0
+        self._pending = bytearray()
+        self._dirty: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._writer: Optional[asyncio.Task] = None
+
+    def open(self) -> None:
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.size = os.fstat(self._fd).st_size
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Buffers a record for the writer task, or writes it at once if the task isn't running."""
+        self._pending += orjson.dumps(record, option=orjson.OPT_NON_STR_KEYS) + b"\n"
+        if self._dirty is None:
+            self.flush()
+        else:
+            self._dirty.set()
+
+    def flush(self) -> None:
+        """Writes out any buffered records."""
+        data = self._take_pending()
+        if not self._write(data):
+            self._requeue(data)
+
+    def _take_pending(self) -> bytes:
+        data, self._pending = bytes(self._pending), bytearray()
+        return data
+
+    def _requeue(self, data: bytes) -> None:
+        """Puts records that failed to write back ahead of anything buffered since."""
+        self._pending[:0] = data
+
+    def _write(self, data: bytes) -> bool:
+        """Appends records to the log, returning False if they couldn't be written."""
+        if not data:
+            return True
+        try:
+            if self._fd is None:
+                self.open()
+            # O_APPEND makes each write land atomically at the end of the file.
+            self.size += os.write(self._fd, data)
+            return True
+        except OSError as e:
+            logger.error("Error writing change log: %s", e)
+            return False
+
+    def start_writer(self) -> None:
+        self._stopping = False
+        self._dirty = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def stop_writer(self) -> None:
+        """Stops the writer task once everything buffered so far has been written."""
+        self._stopping = True
+        self._dirty.set()
+        await self._writer
+        self._dirty = None
+        self.flush()
+
+    async def _write_loop(self) -> None:
+        while not self._stopping:
+            await self._dirty.wait()
+            # Wait briefly so a burst of changes goes out in one write.
+            await asyncio.sleep(LOG_FLUSH_DELAY_SECONDS)
+            self._dirty.clear()
+            # Taken on the event loop, so endpoints never append to a buffer being written.
+            data = self._take_pending()
+            if not await asyncio.to_thread(self._write, data):
+                self._requeue(data)
+            if self.size >= LOG_COMPACT_BYTES:
+                await compact_data()
+
+    def replay(self) -> List[Dict[str, Any]]:
+        """Returns the logged records in order, skipping a line torn by a crash mid-write."""
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    records.append(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    logger.error("Skipping unreadable change log entry.")
+        return records
+
+    def truncate(self) -> None:
+        """Empties the log once a snapshot holds everything it recorded."""
+        if self._fd is None:
+            self.open()
+        os.ftruncate(self._fd, 0)
+        self.size = 0
+
+change_log = PersistenceLog(CHANGE_LOG_FILE)
+
+# The snapshot files and the change log are only ever written by this app, so loading
+# them skips validation; request bodies are still validated by FastAPI.
+# Product IDs were strings in older files, and JSON object keys always are; both become ints here.
+def construct_product(data: Dict[str, Any]) -> Product:
+    data["id"] = int(data["id"])
+    return Product.model_construct(**data)
+
+def construct_cart(data: Dict[str, Any]) -> Cart:
+    items = data["items"]
+    if isinstance(items, list):
+        # Carts saved before items were keyed by product ID
+        return Cart.model_construct(items={int(item["product_id"]): item["quantity"] for item in items})
+    return Cart.model_construct(items={int(product_id): quantity for product_id, quantity in items.items()})
+
+def log_product(product: Product) -> None:
+    change_log.append({"op": "product", "id": product.id, "data": product.__dict__})
+
+def log_product_deleted(product_id: int) -> None:
+    change_log.append({"op": "product_deleted", "id": product_id})
+
+def log_cart(username: str) -> None:
+    change_log.append({"op": "cart", "user": username, "data": carts_db[username].__dict__})
+
+def log_cart_deleted(username: str) -> None:
+    change_log.append({"op": "cart_deleted", "user": username})
+
+def log_user(user: UserInDB) -> None:
+    change_log.append({"op": "user", "data": user.__dict__})
+
+def apply_log_record(record: Dict[str, Any]) -> None:
+    op = record["op"]
+    if op == "product":
+        store_product(construct_product(record["data"]))
+    elif op == "product_deleted":
+        if get_product_by_id(record["id"]):
+            products_db[record["id"]] = None
+    elif op == "cart":
+        carts_db[record["user"]] = construct_cart(record["data"])
+    elif op == "cart_deleted":
+        carts_db.pop(record["user"], None)
+    elif op == "user":
+        user = UserInDB.model_construct(**record["data"])
+        users_db[user.username] = user
+
 def load_data() -> None:
-    """Loads product and cart data from JSON files."""
+    """Loads product, cart and user data from the JSON snapshots, then replays the change log on top."""
     global products_db, carts_db
+    invalidate_products_cache()
 
     # Load products
     if os.path.exists(PRODUCTS_FILE):
         try:
-            with open(PRODUCTS_FILE, "r") as f:
-                data = json.load(f)
-                products_db = {
-                    item_id: Product(**product_data)
-                    for item_id, product_data in data.items()
-                }
-            print(f"{Fore.GREEN}INFO: Loaded {len(products_db)} products.{Style.RESET_ALL}")
+            with open(PRODUCTS_FILE, "rb") as f:
+                data = orjson.loads(f.read())
+                products_db = [None]
+                for product_id, product_data in data.items():
+                    if product_data is None:
+                        # Deleted product; keep its slot so the ID isn't handed out again.
+                        reserve_product_slot(int(product_id))
+                    else:
+                        store_product(construct_product(product_data))
+            logger.info("Loaded %d products.", sum(product is not None for product in products_db))
         except Exception as e:
-            print(f"{Fore.RED}ERROR loading products data: {e}{Style.RESET_ALL}")
-            products_db = {}
+            logger.error("Error loading products data: %s", e)
+            products_db = [None]
     
     # Load carts
     if os.path.exists(CART_FILE):
         try:
-            with open(CART_FILE, "r") as f:
-                data = json.load(f)
+            with open(CART_FILE, "rb") as f:
+                data = orjson.loads(f.read())
                 carts_db = {
-                    user_id: Cart(**cart_data)
+                    user_id: construct_cart(cart_data)
                     for user_id, cart_data in data.items()
                 }
-            print(f"{Fore.GREEN}INFO: Loaded {len(carts_db)} carts.{Style.RESET_ALL}")
+            logger.info("Loaded %d carts.", len(carts_db))
         except Exception as e:
-            print(f"{Fore.RED}ERROR loading carts data: {e}{Style.RESET_ALL}")
+            logger.error("Error loading carts data: %s", e)
             carts_db = {}
-            
-def save_data() -> None:
-    """Saves product and cart data to JSON files."""
+
+    # Load users; users_db is shared with auth, so it is filled in place
+    if os.path.exists(USERS_FILE):
+        try:
+            with open(USERS_FILE, "rb") as f:
+                data = orjson.loads(f.read())
+                users_db.clear()
+                for user_data in data.values():
+                    user = UserInDB.model_construct(**user_data)
+                    users_db[user.username] = user
+            logger.info("Loaded %d users.", len(users_db))
+        except Exception as e:
+            logger.error("Error loading users data: %s", e)
+
+    # Replay changes made after the snapshots were taken
     try:
-        with open(PRODUCTS_FILE, "w") as f:
-            json.dump(
-                {item_id: product.model_dump() for item_id, product in products_db.items()},
-                f, indent=4
-            )
-        with open(CART_FILE, "w") as f:
-            json.dump(
-                {user_id: cart.model_dump() for user_id, cart in carts_db.items()},
-                f, indent=4
-            )
+        records = change_log.replay()
+        for record in records:
+            apply_log_record(record)
+        if records:
+            logger.info("Replayed %d logged changes.", len(records))
+    except Exception as e:
+        logger.error("Error replaying change log: %s", e)
+
+def _write_json_file(path: str, payload: bytes) -> None:
+    """Replaces a snapshot file in one step, through a temp file no other write can share."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+def serialize_snapshots() -> tuple[bytes, bytes, bytes]:
+    """Serializes the current products, carts and users for PRODUCTS_FILE, CART_FILE and USERS_FILE."""
+    return (
+        # Deleted products are written as null so their IDs stay taken after a restart.
+        b"{" + b",".join(
+            b'"%d":%s' % (product_id, product_body(product) if product else b"null")
+            for product_id, product in enumerate(products_db) if product_id
+        ) + b"}",
+        orjson.dumps(
+            {user_id: cart.__dict__ for user_id, cart in carts_db.items()},
+            option=orjson.OPT_NON_STR_KEYS
+        ),
+        orjson.dumps({username: user.__dict__ for username, user in users_db.items()}),
+    )
+
+def write_snapshots(products_payload: bytes, carts_payload: bytes, users_payload: bytes) -> None:
+    """Writes the snapshot files and empties the change log they now cover."""
+    try:
+        _write_json_file(PRODUCTS_FILE, products_payload)
+        _write_json_file(CART_FILE, carts_payload)
+        _write_json_file(USERS_FILE, users_payload)
+        change_log.truncate()
     except Exception as e:
-        print(f"{Fore.RED}ERROR saving data: {e}{Style.RESET_ALL}")
+        logger.error("Error saving data: %s", e)
+
+def save_data() -> None:
+    """Saves full snapshots of product, cart and user data to JSON files and empties the change log."""
+    write_snapshots(*serialize_snapshots())
+
+async def compact_data() -> None:
+    """Folds the change log into fresh snapshots, keeping it from growing without bound."""
+    # Serialized on the event loop so the snapshots match what the log has recorded so far;
+    # records buffered meanwhile are written after the truncate and are already covered.
+    await asyncio.to_thread(write_snapshots, *serialize_snapshots())
+    logger.info("Compacted change log into snapshots.")
 
 def create_initial_admin() -> None:
     """Creates a default admin user if one does not exist."""
@@ -115,23 +389,51 @@ def create_initial_admin() -> None:
             role="admin"
         )
         users_db[admin_username] = admin_user
-        print(f"{Fore.YELLOW}WARNING: Default admin user '{admin_username}' created with password '{admin_password}'.{Style.RESET_ALL}")
+        log_user(admin_user)
+        logger.warning("Default admin user '%s' created with password '%s'.", admin_username, admin_password)
 
 # --- FastAPI App Lifecycle ---
+def start_logging() -> logging.handlers.QueueListener:
+    """Routes the shop's logs through a queue to a rotating log file, so handlers never block on I/O."""
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = logging.handlers.RotatingFileHandler(
+        LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT
+    )
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    return listener
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print(f"{Fore.MAGENTA}Starting up...{Style.RESET_ALL}")
-    load_data()
+    log_listener = start_logging()
+    logger.info("Starting up...")
+    # Loading and saving parse or build every product and cart; keep that off the event loop.
+    await asyncio.to_thread(load_data)
+    change_log.open()
+    change_log.start_writer()
     create_initial_admin()
+    prune_task = asyncio.create_task(_prune_worker())
     yield
-    print(f"{Fore.MAGENTA}Shutting down...{Style.RESET_ALL}")
-    save_data()
+    logger.info("Shutting down...")
+    prune_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await prune_task
+    await change_log.stop_writer()
+    await asyncio.to_thread(save_data)
+    change_log.close()
+    log_listener.stop()
+    logger.handlers.clear()
 
 app = FastAPI(
     title="Secure Shopping Cart API",
     description="An API for managing products and a user's shopping cart.",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # --- Rate Limiting Dependency ---
@@ -140,24 +442,34 @@ async def rate_limit_login(request: Request):
     Dependency to rate limit login attempts per IP address.
     """
     client_ip = request.client.host
-    current_time = time.time()
+    current_time = time.monotonic()
+    attempts = request_counts[client_ip]
     
     # Clean up old timestamps
-    if client_ip in request_counts:
-        request_counts[client_ip] = [t for t in request_counts[client_ip] if current_time - t < LOGIN_WINDOW_SECONDS]
-    else:
-        request_counts[client_ip] = []
+    while attempts and current_time - attempts[0] >= LOGIN_WINDOW_SECONDS:
+        attempts.popleft()
         
     # Check if the limit is exceeded
-    if len(request_counts[client_ip]) >= LOGIN_LIMIT:
-        print(f"{Fore.RED}WARNING: Rate limit exceeded for IP {client_ip}.{Style.RESET_ALL}")
+    if len(attempts) >= LOGIN_LIMIT:
+        logger.warning("Rate limit exceeded for IP %s.", client_ip)
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail=f"Too many requests. Please try again in {LOGIN_WINDOW_SECONDS} seconds."
         )
 
     # Add the current request timestamp
-    request_counts[client_ip].append(current_time)
+    attempts.append(current_time)
+
+def prune_request_counts() -> None:
+    """Drops IPs whose attempts have all aged out of the window."""
+    cutoff = time.monotonic() - LOGIN_WINDOW_SECONDS
+    for client_ip in [ip for ip, attempts in request_counts.items() if not attempts or attempts[-1] <= cutoff]:
+        del request_counts[client_ip]
+
+async def _prune_worker() -> None:
+    while True:
+        await asyncio.sleep(RATE_LIMIT_PRUNE_SECONDS)
+        prune_request_counts()
 
 # --- API Endpoints ---
 @app.post("/register/", status_code=status.HTTP_201_CREATED, summary="Register a new customer", dependencies=[Depends(rate_limit_login)])
@@ -169,7 +481,13 @@ async def register_user(user_login: UserLogin):
             detail="Username already registered"
         )
     
-    hashed_password = hash_password(user_login.password)
+    hashed_password = await run_in_threadpool(hash_password, user_login.password)
+    if user_login.username in users_db:
+        # Registered by a concurrent request while we were hashing.
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Username already registered"
+        )
     
     new_user = UserInDB(
         username=user_login.username,
@@ -178,15 +496,15 @@ async def register_user(user_login: UserLogin):
     )
     
     users_db[user_login.username] = new_user
-    save_data()
-    print(f"{Fore.GREEN}INFO: User '{user_login.username}' registered successfully.{Style.RESET_ALL}")
+    log_user(new_user)
+    logger.info("User '%s' registered successfully.", user_login.username)
     
     return {"message": "Registration successful"}
 
 @app.post("/login/", summary="Log in an existing user", dependencies=[Depends(rate_limit_login)])
 async def login(user: UserInDB = Depends(get_authenticated_user)):
     """Authenticates a user and confirms successful login."""
-    print(f"{Fore.GREEN}INFO: User '{user.username}' logged in successfully.{Style.RESET_ALL}")
+    logger.info("User '%s' logged in successfully.", user.username)
     return {"message": "Login successful!"}
 
 @app.post("/admin/add_product/", response_model=Product, status_code=status.HTTP_201_CREATED, summary="Add a new product (Admin only)")
@@ -197,93 +515,121 @@ async def add_product(
     """
     Adds a new product to the catalog. This endpoint is restricted to users with the 'admin' role.
     """
-    product_id = str(len(products_db) + 1) # Simple ID generation
+    product_id = len(products_db) # Next free slot
     new_product = Product(id=product_id, **product_data.model_dump())
-    products_db[product_id] = new_product
-    save_data()
-    print(f"{Fore.GREEN}INFO: Admin '{admin_user.username}' added new product '{new_product.name}'.{Style.RESET_ALL}")
+    products_db.append(new_product)
+    invalidate_products_cache(product_id)
+    log_product(new_product)
+    logger.info("Admin '%s' added new product '%s'.", admin_user.username, new_product.name)
     return new_product
 
 @app.get("/products/", response_model=List[Product], summary="Get all products (Public)")
 async def get_products():
     """Retrieves a list of all available products in the catalog."""
-    return list(products_db.values())
+    global _products_body
+    if _products_body is None:
+        _products_body = b"[" + b",".join(product_body(product) for product in products_db if product is not None) + b"]"
+    return Response(content=_products_body, media_type="application/json")
 
 @app.get(
-    "/products/{product_id}",
+    "/products/{product_id:int}",
     response_model=Product,
     summary="Get a single product by ID (Public)"
 )
-async def get_product(product_id: str):
+async def get_product(product_id: int):
     """
     Retrieves a single product from the catalog using its unique ID.
     """
-    product = products_db.get(product_id)
+    product = get_product_by_id(product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
-    return product
+    return Response(content=product_body(product), media_type="application/json")
 
 @app.put(
-    "/admin/products/{product_id}",
+    "/admin/products/{product_id:int}",
     response_model=Product,
     summary="Update an existing product (Admin only)"
 )
 async def update_product(
-    product_id: str,
+    product_id: int,
     product_data: ProductBase,
     admin_user: UserInDB = Depends(get_current_admin)
 ):
     """
     Updates the details of an existing product. Restricted to admins.
     """
-    if product_id not in products_db:
+    product = get_product_by_id(product_id)
+    if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
     
     # Update the product data while keeping the original ID
-    updated_product = products_db[product_id].model_copy(update=product_data.model_dump())
+    updated_product = product.model_copy(update=product_data.model_dump())
     
-    products_db[product_id] = updated_product
-    save_data()
-    print(f"{Fore.GREEN}INFO: Admin '{admin_user.username}' updated product '{updated_product.name}'.{Style.RESET_ALL}")
+    store_product(updated_product)
+    invalidate_products_cache(product_id)
+    log_product(updated_product)
+    logger.info("Admin '%s' updated product '%s'.", admin_user.username, updated_product.name)
     return updated_product
 
 @app.delete(
-    "/admin/products/{product_id}",
+    "/admin/products/{product_id:int}",
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Delete a product (Admin only)"
 )
 async def delete_product(
-    product_id: str,
+    product_id: int,
     admin_user: UserInDB = Depends(get_current_admin)
 ):
     """
     Deletes a product from the catalog. Restricted to admins.
     """
-    if product_id not in products_db:
+    product = get_product_by_id(product_id)
+    if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
     
-    del products_db[product_id]
-    save_data()
-    print(f"{Fore.RED}INFO: Admin '{admin_user.username}' deleted product with ID '{product_id}'.{Style.RESET_ALL}")
+    products_db[product.id] = None
+    invalidate_products_cache(product_id)
+    log_product_deleted(product_id)
+    logger.info("Admin '%s' deleted product with ID '%s'.", admin_user.username, product_id)
     return None
 
 # --- Cart Endpoints ---
-@app.get("/cart/", response_model=Cart, summary="Get the authenticated user's cart")
+@app.get("/cart/", response_model=CartResponse, summary="Get the authenticated user's cart")
 async def get_cart(current_user: UserInDB = Depends(get_authenticated_user)):
     """
     Retrieves the shopping cart for the currently logged-in user.
     """
-    # Returns the cart or an empty cart if the user has no items yet
-    return carts_db.get(current_user.username, Cart())
+    # Returns the cart or an empty cart if the user has no items yet.
+    # Encoded straight from the items dict; CartResponse only documents the shape.
+    cart = carts_db.get(current_user.username)
+    body = orjson.dumps({"items": [
+        {"product_id": product_id, "quantity": quantity}
+        for product_id, quantity in (cart.items.items() if cart else ())
+    ]})
+    return Response(content=body, media_type="application/json")
+
+@app.get("/cart/total", summary="Get the total cost of the authenticated user's cart")
+async def get_cart_total(current_user: UserInDB = Depends(get_authenticated_user)):
+    """
+    Calculates the current cost of everything in the authenticated user's cart.
+    Products removed from the catalog since they were added are left out; checkout reports them.
+    """
+    cart = carts_db.get(current_user.username)
+    total_cost = math.fsum(
+        product.price * quantity
+        for product_id, quantity in (cart.items.items() if cart else ())
+        if (product := get_product_by_id(product_id)) is not None
+    )
+    return {"total_cost": f"${total_cost:.2f}"}
 
 @app.post("/cart/add/", summary="Add or update an item in the cart (Authenticated users only)")
 async def add_to_cart(
@@ -294,38 +640,29 @@ async def add_to_cart(
     Adds a specific quantity of a product to the authenticated user's cart.
     If the product is already in the cart, its quantity is updated.
     """
-    product = products_db.get(cart_item.product_id)
+    product = get_product_by_id(cart_item.product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
 
-    # Get or create the user's cart
-    cart = carts_db.get(current_user.username, Cart())
-    
-    # Check if the product is already in the cart
-    found = False
-    for item in cart.items:
-        if item.product_id == cart_item.product_id:
-            item.quantity += cart_item.quantity
-            found = True
-            break
-            
-    if not found:
-        cart.items.append(cart_item)
+    cart = carts_db.get(current_user.username)
     
-    # Check for stock after updating quantity
-    updated_item = next((item for item in cart.items if item.product_id == cart_item.product_id), None)
-    if updated_item and updated_item.quantity > product.stock:
+    # Add to any quantity already in the cart, checking stock before changing anything
+    new_quantity = (cart.items.get(cart_item.product_id, 0) if cart else 0) + cart_item.quantity
+    if new_quantity > product.stock:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Requested quantity exceeds available stock"
         )
-            
-    carts_db[current_user.username] = cart
-    save_data()
-    print(f"{Fore.GREEN}INFO: User '{current_user.username}' updated cart with product '{product.name}'.{Style.RESET_ALL}")
+    
+    # Create the user's cart only when they don't have one yet; existing carts are updated in place
+    if cart is None:
+        cart = carts_db[current_user.username] = Cart.model_construct(items={})
+    cart.items[cart_item.product_id] = new_quantity
+    log_cart(current_user.username)
+    logger.info("User '%s' added %d of product '%s' to their cart.", current_user.username, cart_item.quantity, product.name)
     
     return {"message": f"Cart updated. Added {cart_item.quantity} of product {product.name}."}
 
@@ -338,7 +675,7 @@ async def update_cart_item_quantity(
     Updates the quantity of a specific item in the authenticated user's cart.
     The new quantity must be greater than 0 and not exceed product stock.
     """
-    product = products_db.get(cart_item.product_id)
+    product = get_product_by_id(cart_item.product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -351,31 +688,24 @@ async def update_cart_item_quantity(
             detail="Requested quantity exceeds available stock"
         )
         
-    cart = carts_db.get(current_user.username, Cart())
+    cart = carts_db.get(current_user.username)
     
-    # Find and update the item in the cart
-    item_updated = False
-    for item in cart.items:
-        if item.product_id == cart_item.product_id:
-            item.quantity = cart_item.quantity
-            item_updated = True
-            break
-
-    if not item_updated:
+    # Update the item in the cart
+    if cart is None or cart_item.product_id not in cart.items:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found in cart"
         )
+    cart.items[cart_item.product_id] = cart_item.quantity
 
-    carts_db[current_user.username] = cart
-    save_data()
-    print(f"{Fore.GREEN}INFO: User '{current_user.username}' updated quantity for product '{product.name}' to {cart_item.quantity}.{Style.RESET_ALL}")
+    log_cart(current_user.username)
+    logger.info("User '%s' updated quantity for product '%s' to %d.", current_user.username, product.name, cart_item.quantity)
     
     return {"message": f"Updated quantity for product {product.name} to {cart_item.quantity}."}
 
-@app.delete("/cart/{product_id}", summary="Remove a single item from the cart (Authenticated users only)")
+@app.delete("/cart/{product_id:int}", summary="Remove a single item from the cart (Authenticated users only)")
 async def remove_from_cart(
-    product_id: str,
+    product_id: int,
     current_user: UserInDB = Depends(get_authenticated_user)
 ):
     """
@@ -388,20 +718,15 @@ async def remove_from_cart(
             detail="Cart is empty or not found"
         )
     
-    # Use list comprehension to create a new list without the item to be removed
-    updated_items = [item for item in cart.items if item.product_id != product_id]
-    
-    # Check if the product was actually removed
-    if len(updated_items) == len(cart.items):
+    if product_id not in cart.items:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found in cart"
         )
 
-    cart.items = updated_items
-    carts_db[current_user.username] = cart
-    save_data()
-    print(f"{Fore.GREEN}INFO: User '{current_user.username}' removed product '{product_id}' from cart.{Style.RESET_ALL}")
+    del cart.items[product_id]
+    log_cart(current_user.username)
+    logger.info("User '%s' removed product '%s' from cart.", current_user.username, product_id)
 
     return {"message": f"Product {product_id} removed from cart."}
 
@@ -419,8 +744,8 @@ async def clear_cart(
         )
     
     del carts_db[current_user.username]
-    save_data()
-    print(f"{Fore.GREEN}INFO: User '{current_user.username}' cleared their cart.{Style.RESET_ALL}")
+    log_cart_deleted(current_user.username)
+    logger.info("User '%s' cleared their cart.", current_user.username)
 
     return {"message": "Cart cleared successfully."}
 
@@ -441,36 +766,40 @@ async def checkout(current_user: UserInDB = Depends(get_authenticated_user)):
 
     # First Pass: Verify Stock for All Items
     total_cost = 0.0
-    for item in cart.items:
-        product = products_db.get(item.product_id)
+    # Products are looked up once here and reused when deducting stock below
+    checked_items: List[tuple[Product, int]] = []
+    for product_id, quantity in cart.items.items():
+        product = get_product_by_id(product_id)
         
         # Check if the product still exists
         if not product:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Product with ID '{item.product_id}' not found. Cannot proceed with checkout."
+                detail=f"Product with ID '{product_id}' not found. Cannot proceed with checkout."
             )
         
         # Check if there is enough stock
-        if item.quantity > product.stock:
+        if quantity > product.stock:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Not enough stock for product '{product.name}'. Available: {product.stock}, Requested: {item.quantity}."
+                detail=f"Not enough stock for product '{product.name}'. Available: {product.stock}, Requested: {quantity}."
             )
         
         # Calculate cost
-        total_cost += product.price * item.quantity
+        total_cost += product.price * quantity
+        checked_items.append((product, quantity))
     
     # Second Pass: Deduct Stock and Clear Cart
-    for item in cart.items:
-        product = products_db[item.product_id]
-        product.stock -= item.quantity
+    for product, quantity in checked_items:
+        product.stock -= quantity
+        log_product(product)
+        invalidate_products_cache(product.id)
     
     # Clear the user's cart
     del carts_db[current_user.username]
+    log_cart_deleted(current_user.username)
     
-    save_data()
-    print(f"{Fore.GREEN}INFO: User '{current_user.username}' successfully completed checkout. Total cost: ${total_cost:.2f}.{Style.RESET_ALL}")
+    logger.info("User '%s' successfully completed checkout. Total cost: $%.2f.", current_user.username, total_cost)
     
     return {
         "message": "Checkout successful!", 
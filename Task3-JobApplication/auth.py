@@ -1,10 +1,19 @@
 # auth.py
 
 from fastapi import HTTPException, status, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from pydantic import BaseModel
 from typing import Dict, Optional
 from passlib.context import CryptContext
+import hashlib
+import hmac
+import threading
+import time
+
+# --- Constants ---
+AUTH_CACHE_TTL_SECONDS = 60
+AUTH_CACHE_MAX_SIZE = 10000
 
 # --- Pydantic Models for Authentication ---
 class UserBase(BaseModel):
@@ -25,6 +34,10 @@ class UserLogin(BaseModel):
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBasic()
 
+# Verified against when the username doesn't exist, so that path costs the same bcrypt
+# round as a wrong password and response time doesn't reveal which usernames are taken.
+_DUMMY_HASH = pwd_context.hash("dummy")
+
 def hash_password(password: str) -> str:
     """Hashes a plain-text password using bcrypt."""
     return pwd_context.hash(password)
@@ -33,16 +46,47 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifies a plain-text password against a hashed password."""
     return pwd_context.verify(plain_password, hashed_password)
 
+# Recent bcrypt results, keyed by sha256("username:password") -> (expires_at, hash, result).
+# Failed attempts are cached too, so repeated bad guesses don't each cost a bcrypt round.
+# An entry only counts while the stored hash still matches the one it was checked against.
+_auth_cache: Dict[bytes, tuple[float, str, bool]] = {}
+_auth_cache_lock = threading.Lock()
+
+def _cache_key(username: str, password: str) -> bytes:
+    return hashlib.sha256(f"{username}:{password}".encode()).digest()
+
+def _cached_result(key: bytes, hashed_password: str) -> Optional[bool]:
+    """Returns a recent verification result for these credentials, or None if there isn't one."""
+    with _auth_cache_lock:
+        cached = _auth_cache.get(key)
+        if (
+            cached
+            and cached[0] > time.monotonic()
+            and hmac.compare_digest(cached[1].encode(), hashed_password.encode())
+        ):
+            return cached[2]
+    return None
+
+def _verify_and_cache(key: bytes, password: str, hashed_password: str) -> bool:
+    """Runs the bcrypt check and remembers its result."""
+    result = verify_password(password, hashed_password)
+    now = time.monotonic()
+    with _auth_cache_lock:
+        if key not in _auth_cache and len(_auth_cache) >= AUTH_CACHE_MAX_SIZE:
+            del _auth_cache[next(iter(_auth_cache))]
+        _auth_cache[key] = (now + AUTH_CACHE_TTL_SECONDS, hashed_password, result)
+    return result
+
 # --- Database Mock-up ---
 # This dictionary will act as our in-memory user database.
 users_db: Dict[str, UserInDB] = {}
 
-def get_users_db() -> Dict[str, UserInDB]:
+async def get_users_db() -> Dict[str, UserInDB]:
     """Dependency to provide access to the user database."""
     return users_db
 
 # --- Dependency Injection Functions ---
-def get_authenticated_user(
+async def get_authenticated_user(
     credentials: HTTPBasicCredentials = Depends(security),
     db: Dict[str, UserInDB] = Depends(get_users_db)
 ) -> UserInDB:
@@ -51,18 +95,26 @@ def get_authenticated_user(
     Returns the user object if successful, otherwise raises an HTTPException.
     """
     user = db.get(credentials.username)
-    if not user or not verify_password(credentials.password, user.hashed_password):
+    hashed_password = user.hashed_password if user else _DUMMY_HASH
+    key = _cache_key(credentials.username, credentials.password)
+    verified = _cached_result(key, hashed_password)
+    if verified is None:
+        verified = await run_in_threadpool(
+            _verify_and_cache, key, credentials.password, hashed_password
+        )
+    if not user or not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
         )
     return user
 
-def get_current_admin(user: UserInDB = Depends(get_authenticated_user)) -> UserInDB:
+async def get_current_admin(user: UserInDB = Depends(get_authenticated_user)) -> UserInDB:
     """
     Dependency that authenticates a user and checks if they have the 'admin' role.
     Raises an HTTPException if the user is not an admin.
     """
+    # Roles are not secret, so a plain comparison is fine here.
     if user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -1,12 +1,21 @@
 # main.py
 
 from fastapi import FastAPI, HTTPException, status, Depends, Query
-from pydantic import BaseModel, Field
-from typing import Dict, List, Optional
-from contextlib import asynccontextmanager
-import json
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Dict, List, Optional, Set
+from contextlib import asynccontextmanager, suppress
+import asyncio
+import logging
+import logging.handlers
 import os
-import uuid
+import queue
+import secrets
+import sys
+import tempfile
+import threading
+import orjson
 from colorama import Fore, Style, init
 
 # Import authentication and user models from auth.py
@@ -18,18 +27,21 @@ from auth import (
     users_db
 )
 
-# Initialize colorama for colored console output
-init(autoreset=True)
+logger = logging.getLogger("jobs")
 
 # --- Constants ---
+# Each user's applications live in their own file here, so applying only rewrites that user's file.
+APPLICATIONS_DIR = "applications"
+# Single file that held every application before they were split per user; migrated on load.
 APPLICATIONS_FILE = "applications.json"
 LISTINGS_FILE = "job_listings.json"
 USERS_FILE = "users.json"
+FLUSH_INTERVAL_SECONDS = 1.0
 
 # --- Pydantic Models ---
 class JobListing(BaseModel):
     """Model for a job listing posted by an admin."""
-    listing_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    listing_id: str = Field(default_factory=lambda: secrets.token_hex(8))
     job_title: str
     company: str
     description: str
@@ -44,7 +56,7 @@ class UserJobApplication(BaseModel):
 # This is the full model stored in the database
 class JobApplication(BaseModel):
     """Model for a user's job application."""
-    application_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    application_id: str = Field(default_factory=lambda: secrets.token_hex(8))
     listing_id: str
     job_title: str
     company: str
@@ -52,79 +64,159 @@ class JobApplication(BaseModel):
     status: str = "Applied"
     username: str
 
+# Validate and serialize whole files in one pass through pydantic-core instead of model by model.
+_users_adapter = TypeAdapter(Dict[str, UserInDB])
+_applications_adapter = TypeAdapter(List[JobApplication])
+_listings_adapter = TypeAdapter(Dict[str, JobListing])
+
 # --- Mock-up Databases ---
-applications_db: List[JobApplication] = []
+# Applications grouped by the username that submitted them.
+applications_db: Dict[str, List[JobApplication]] = {}
+# The same applications grouped by listing, so admins can list applicants without a scan.
+applications_by_listing: Dict[str, List[JobApplication]] = {}
 listings_db: Dict[str, JobListing] = {}
+# Serialized body of GET /listings/, rebuilt on the first request after a listing changes.
+_open_listings_body: Optional[bytes] = None
+
+def invalidate_listings_cache() -> None:
+    """Drops the cached open-listings body."""
+    global _open_listings_body
+    _open_listings_body = None
 
 # --- Utility Functions for Data Persistence ---
 def load_data() -> None:
     """Loads all data from JSON files."""
-    global applications_db, listings_db, users_db
+    global applications_db, applications_by_listing, listings_db, users_db
+    invalidate_listings_cache()
 
     # Load users
     if os.path.exists(USERS_FILE):
         try:
-            with open(USERS_FILE, "r") as f:
-                data = json.load(f)
-                users_db.update({key: UserInDB(**user) for key, user in data.items()})
-            print(f"{Fore.GREEN}INFO: Loaded user data.{Style.RESET_ALL}")
+            with open(USERS_FILE, "rb") as f:
+                users_db.update(_users_adapter.validate_json(f.read()))
+            logger.info("Loaded user data.")
         except Exception as e:
-            print(f"{Fore.RED}ERROR loading user data: {e}{Style.RESET_ALL}")
+            logger.error("Error loading user data: %s", e)
 
     # Load applications
-    if os.path.exists(APPLICATIONS_FILE):
+    applications_db = {}
+    if os.path.isdir(APPLICATIONS_DIR):
+        try:
+            for file_name in os.listdir(APPLICATIONS_DIR):
+                if not file_name.endswith(".json"):
+                    continue
+                with open(os.path.join(APPLICATIONS_DIR, file_name), "rb") as f:
+                    user_applications = _applications_adapter.validate_json(f.read())
+                if user_applications:
+                    applications_db[user_applications[0].username] = user_applications
+            logger.info("Loaded application data.")
+        except Exception as e:
+            logger.error("Error loading applications data: %s", e)
+            applications_db = {}
+    elif os.path.exists(APPLICATIONS_FILE):
         try:
-            with open(APPLICATIONS_FILE, "r") as f:
-                data = json.load(f)
-                applications_db = [JobApplication(**app) for app in data]
-            print(f"{Fore.GREEN}INFO: Loaded application data.{Style.RESET_ALL}")
+            with open(APPLICATIONS_FILE, "rb") as f:
+                for application in _applications_adapter.validate_json(f.read()):
+                    applications_db.setdefault(application.username, []).append(application)
+            logger.info("Loaded application data from %s.", APPLICATIONS_FILE)
+            mark_applications_dirty(*applications_db)
         except Exception as e:
-            print(f"{Fore.RED}ERROR loading applications data: {e}{Style.RESET_ALL}")
-            applications_db = []
+            logger.error("Error loading applications data: %s", e)
+            applications_db = {}
+    applications_by_listing = {}
+    for user_applications in applications_db.values():
+        for application in user_applications:
+            applications_by_listing.setdefault(application.listing_id, []).append(application)
 
     # Load listings
     if os.path.exists(LISTINGS_FILE):
         try:
-            with open(LISTINGS_FILE, "r") as f:
-                data = json.load(f)
-                listings_db = {
-                    key: JobListing(**listing)
-                    for key, listing in data.items()
-                }
-            print(f"{Fore.GREEN}INFO: Loaded job listings.{Style.RESET_ALL}")
+            with open(LISTINGS_FILE, "rb") as f:
+                listings_db = _listings_adapter.validate_json(f.read())
+            logger.info("Loaded job listings.")
         except Exception as e:
-            print(f"{Fore.RED}ERROR loading listings data: {e}{Style.RESET_ALL}")
+            logger.error("Error loading listings data: %s", e)
             listings_db = {}
 
-def save_data() -> None:
-    """Saves all data to JSON files."""
+def _write_json_file(path: str, payload: bytes) -> None:
+    """Writes one data file via its own temp file and os.replace."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
     try:
-        # Save applications
-        with open(APPLICATIONS_FILE, "w") as f:
-            serializable_apps = [app.model_dump() for app in applications_db]
-            json.dump(serializable_apps, f, indent=4)
-        print(f"{Fore.GREEN}INFO: Saved application data.{Style.RESET_ALL}")
-
-        # Save listings
-        with open(LISTINGS_FILE, "w") as f:
-            serializable_listings = {
-                key: listing.model_dump()
-                for key, listing in listings_db.items()
-            }
-            json.dump(serializable_listings, f, indent=4)
-        print(f"{Fore.GREEN}INFO: Saved job listings.{Style.RESET_ALL}")
-
-        # Save users
-        with open(USERS_FILE, "w") as f:
-            serializable_users = {
-                key: user.model_dump()
-                for key, user in users_db.items()
-            }
-            json.dump(serializable_users, f, indent=4)
-        print(f"{Fore.GREEN}INFO: Saved user data.{Style.RESET_ALL}")
-
-    except Exception as e:
-        print(f"{Fore.RED}ERROR saving data: {e}{Style.RESET_ALL}")
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+def user_applications_file(username: str) -> str:
+    # Usernames like "../bob" can't escape the directory once hex-encoded.
+    return os.path.join(APPLICATIONS_DIR, username.encode().hex() + ".json")
+
+def serialize_listings() -> bytes:
+    return _listings_adapter.dump_json(listings_db)
+
+def serialize_users() -> bytes:
+    return _users_adapter.dump_json(users_db)
+
+# Files and users' application files changed since the last flush; the flusher started
+# in lifespan writes only these.
+_SERIALIZERS = {
+    LISTINGS_FILE: serialize_listings,
+    USERS_FILE: serialize_users,
+}
+_dirty_files: Set[str] = set()
+_dirty_applicants: Set[str] = set()
+_flush_task: Optional[asyncio.Task] = None
+# Held while writing, so a write still running when shutdown cancels the flusher finishes first.
+_save_lock = threading.Lock()
+
+def take_dirty_payloads() -> List[tuple[str, bytes]]:
+    """Serializes every file changed since the last flush and clears the dirty flags."""
+    payloads = [(path, _SERIALIZERS[path]()) for path in _dirty_files]
+    payloads += [
+        (user_applications_file(username), _applications_adapter.dump_json(applications_db.get(username, [])))
+        for username in _dirty_applicants
+    ]
+    _dirty_files.clear()
+    _dirty_applicants.clear()
+    return payloads
+
+def write_payloads(payloads: List[tuple[str, bytes]]) -> None:
+    """Writes serialized files to disk; safe to run in a worker thread."""
+    with _save_lock:
+        for path, payload in payloads:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                _write_json_file(path, payload)
+                logger.info("Saved %s.", path)
+            except Exception as e:
+                logger.error("Error saving %s: %s", path, e)
+
+def flush_dirty() -> None:
+    """Rewrites each file that has changed since the last flush."""
+    write_payloads(take_dirty_payloads())
+
+def mark_dirty(*files: str) -> None:
+    """Schedules the given files for the next flush; writes immediately if the flusher isn't running."""
+    _dirty_files.update(files)
+    if _flush_task is None:
+        flush_dirty()
+
+def mark_applications_dirty(*usernames: str) -> None:
+    """Schedules the given users' application files for the next flush, like mark_dirty."""
+    _dirty_applicants.update(usernames)
+    if _flush_task is None:
+        flush_dirty()
+
+async def flusher() -> None:
+    while True:
+        await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+        # Serialized on the event loop so the worker thread never sees data mid-mutation.
+        payloads = take_dirty_payloads()
+        if payloads:
+            await asyncio.to_thread(write_payloads, payloads)
 
 def create_initial_admin() -> None:
     """Creates a default admin user if one does not exist."""
@@ -138,11 +230,11 @@ def create_initial_admin() -> None:
             role="admin"
         )
         users_db[admin_username] = admin_user
-        save_data() # Save the new user to disk
-        print(f"{Fore.YELLOW}WARNING: Default admin user '{admin_username}' created with password '{admin_password}'.{Style.RESET_ALL}")
+        mark_dirty(USERS_FILE) # Save the new user to disk
+        logger.warning("Default admin user '%s' created with password '%s'.", admin_username, admin_password)
 
 # --- Custom Dependencies ---
-def is_admin(current_user: UserInDB = Depends(get_authenticated_user)):
+async def is_admin(current_user: UserInDB = Depends(get_authenticated_user)):
     """A dependency that checks if the current user is an admin."""
     if current_user.role != "admin":
         raise HTTPException(
@@ -152,20 +244,55 @@ def is_admin(current_user: UserInDB = Depends(get_authenticated_user)):
     return current_user
 
 # --- FastAPI App Lifecycle ---
+class ColorFormatter(logging.Formatter):
+    """Colors each log line by its level."""
+    COLORS = {logging.INFO: Fore.GREEN, logging.WARNING: Fore.YELLOW, logging.ERROR: Fore.RED}
+
+    def format(self, record: logging.LogRecord) -> str:
+        return f"{self.COLORS.get(record.levelno, '')}{super().format(record)}{Style.RESET_ALL}"
+
+def start_logging() -> logging.handlers.QueueListener:
+    """Routes the app's logs through a queue to stderr, so handlers never block on console I/O."""
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stderr)
+    # Only color the output when a person is watching; redirected logs stay plain text.
+    if sys.stderr.isatty():
+        init()
+        handler.setFormatter(ColorFormatter("%(levelname)s: %(message)s"))
+    else:
+        handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    return listener
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print(f"{Fore.MAGENTA}Starting up...{Style.RESET_ALL}")
-    load_data()
+    global _flush_task
+    log_listener = start_logging()
+    logger.info("Starting up...")
+    # Loading parses every file; keep that off the event loop.
+    await asyncio.to_thread(load_data)
     create_initial_admin()
+    _flush_task = asyncio.create_task(flusher())
     yield
-    print(f"{Fore.MAGENTA}Shutting down...{Style.RESET_ALL}")
-    save_data()
+    logger.info("Shutting down...")
+    _flush_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await _flush_task
+    _flush_task = None
+    flush_dirty()
+    log_listener.stop()
+    logger.handlers.clear()
 
 app = FastAPI(
     title="Job Application Tracker API",
     description="An API for tracking personal job applications and managing job listings.",
     version="2.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # --- Authentication Endpoints (unchanged) ---
@@ -178,7 +305,13 @@ async def register_user(user_login: UserLogin):
             detail="Username already registered"
         )
     
-    hashed_password = hash_password(user_login.password)
+    hashed_password = await run_in_threadpool(hash_password, user_login.password)
+    if user_login.username in users_db:
+        # Registered by a concurrent request while we were hashing.
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Username already registered"
+        )
     
     new_user = UserInDB(
         username=user_login.username,
@@ -187,15 +320,15 @@ async def register_user(user_login: UserLogin):
     )
     
     users_db[user_login.username] = new_user
-    save_data() # Save the new user to disk
-    print(f"{Fore.GREEN}INFO: User '{user_login.username}' registered successfully.{Style.RESET_ALL}")
+    mark_dirty(USERS_FILE) # Save the new user to disk
+    logger.info("User '%s' registered successfully.", user_login.username)
     
     return {"message": "Registration successful"}
 
 @app.post("/login/", summary="Log in an existing user")
 async def login(user: UserInDB = Depends(get_authenticated_user)):
     """Authenticates a user and confirms successful login."""
-    print(f"{Fore.GREEN}INFO: User '{user.username}' logged in successfully.{Style.RESET_ALL}")
+    logger.info("User '%s' logged in successfully.", user.username)
     return {"message": "Login successful!"}
 
 # --- Job Listings Endpoints (Admin-only) ---
@@ -212,8 +345,9 @@ async def add_listing(
         )
 
     listings_db[listing.listing_id] = listing
-    save_data()
-    print(f"{Fore.GREEN}INFO: Admin '{current_user.username}' added a new listing: '{listing.job_title}'.{Style.RESET_ALL}")
+    invalidate_listings_cache()
+    mark_dirty(LISTINGS_FILE)
+    logger.info("Admin '%s' added a new listing: '%s'.", current_user.username, listing.job_title)
     return {"message": "Listing added successfully", "listing_id": listing.listing_id}
 
 @app.put("/listings/{listing_id}", summary="[Admin] Update a job listing")
@@ -230,8 +364,9 @@ async def update_listing(
         )
     
     listings_db[listing_id] = updated_listing
-    save_data()
-    print(f"{Fore.GREEN}INFO: Admin '{current_user.username}' updated listing '{listing_id}'.{Style.RESET_ALL}")
+    invalidate_listings_cache()
+    mark_dirty(LISTINGS_FILE)
+    logger.info("Admin '%s' updated listing '%s'.", current_user.username, listing_id)
     return {"message": "Listing updated successfully"}
 
 @app.delete("/listings/{listing_id}", summary="[Admin] Delete a job listing")
@@ -247,8 +382,9 @@ async def delete_listing(
         )
     
     del listings_db[listing_id]
-    save_data()
-    print(f"{Fore.GREEN}INFO: Admin '{current_user.username}' deleted listing '{listing_id}'.{Style.RESET_ALL}")
+    invalidate_listings_cache()
+    mark_dirty(LISTINGS_FILE)
+    logger.info("Admin '%s' deleted listing '%s'.", current_user.username, listing_id)
     return {"message": "Listing deleted successfully"}
 
 # --- Job Listings (User and Admin) ---
@@ -257,12 +393,15 @@ async def get_listings(
     current_user: UserInDB = Depends(get_authenticated_user)
 ):
     """Retrieves all open job listings for a logged-in user."""
-    open_listings = [
-        listing for listing in listings_db.values()
-        if listing.status == "open"
-    ]
-    print(f"{Fore.GREEN}INFO: User '{current_user.username}' viewed job listings.{Style.RESET_ALL}")
-    return open_listings
+    global _open_listings_body
+    if _open_listings_body is None:
+        # Listings are already validated, so encode them directly instead of through response_model.
+        _open_listings_body = orjson.dumps([
+            listing.__dict__ for listing in listings_db.values()
+            if listing.status == "open"
+        ])
+    logger.info("User '%s' viewed job listings.", current_user.username)
+    return Response(content=_open_listings_body, media_type="application/json")
 
 @app.get("/listings/{listing_id}/applicants/", summary="[Admin] View all applicants for a job listing with filtering and pagination")
 async def get_applicants(
@@ -278,10 +417,8 @@ async def get_applicants(
     Supports filtering by status, sorting, and pagination.
     """
     # 1. Filter applicants for the specific job listing
-    applicants = [
-        app for app in applications_db
-        if app.listing_id == listing_id
-    ]
+    # Copied, since sorting below must not reorder the index
+    applicants = list(applications_by_listing.get(listing_id, []))
 
     # Handle case where no applicants are found for the listing
     if not applicants:
@@ -305,7 +442,7 @@ async def get_applicants(
     # 4. Apply pagination
     paged_applicants = applicants[skip : skip + limit]
 
-    print(f"{Fore.GREEN}INFO: Admin '{current_user.username}' viewed applicants for listing '{listing_id}'.{Style.RESET_ALL}")
+    logger.info("Admin '%s' viewed applicants for listing '%s'.", current_user.username, listing_id)
     
     return {"listing_id": listing_id, "applicants": paged_applicants}
 
@@ -343,10 +480,11 @@ async def add_application(
         username=current_user.username
     )
     
-    applications_db.append(full_application)
+    applications_db.setdefault(current_user.username, []).append(full_application)
+    applications_by_listing.setdefault(full_application.listing_id, []).append(full_application)
     
-    save_data()
-    print(f"{Fore.GREEN}INFO: User '{current_user.username}' added a new application for listing '{full_application.listing_id}'.{Style.RESET_ALL}")
+    mark_applications_dirty(current_user.username)
+    logger.info("User '%s' added a new application for listing '%s'.", current_user.username, full_application.listing_id)
     
     return {"message": "Application added successfully."}
 
@@ -357,11 +495,7 @@ async def get_applications(
     """
     Retrieves all job applications for the currently logged-in user.
     """
-    # Filter the global list of applications for the current user's username
-    user_applications = [
-        app for app in applications_db
-        if app.username == current_user.username
-    ]
-    print(f"{Fore.GREEN}INFO: User '{current_user.username}' retrieved their applications.{Style.RESET_ALL}")
+    user_applications = applications_db.get(current_user.username, [])
+    logger.info("User '%s' retrieved their applications.", current_user.username)
     
     return user_applications
@@ -5,18 +5,27 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from typing import Dict, Optional
+from contextlib import suppress
 from decouple import config
-import json
+import logging
 import os
-from colorama import init, Fore, Style
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger("notes")
 
 # --- Constants ---
 SECRET_KEY = config("SECRET_KEY")
 ALGORITHM = config("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(config("ACCESS_TOKEN_EXPIRE_MINUTES"))
+# Cost factor for new password hashes; lower it in development for faster logins.
+BCRYPT_ROUNDS = config("BCRYPT_ROUNDS", default=12, cast=int)
 USERS_FILE = "users.json"
+TOKEN_CACHE_TTL_SECONDS = 60
+TOKEN_CACHE_MAX_SIZE = 10000
 
 # --- Models ---
 class UserInDB(BaseModel):
@@ -39,9 +48,12 @@ class Token(BaseModel):
     token_type: str = "bearer"
 
 # --- Authentication and Hashing ---
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# Built once and reused, so loading validates the whole file in one pydantic-core call.
+_users_adapter = TypeAdapter(Dict[str, UserInDB])
+
 # In-memory database for users
 users_db: Dict[str, UserInDB] = {}
 
@@ -50,21 +62,42 @@ def load_users() -> None:
     global users_db
     if os.path.exists(USERS_FILE):
         try:
-            with open(USERS_FILE, "r") as f:
-                data = json.load(f)
-                users_db.update({key: UserInDB(**user) for key, user in data.items()})
+            with open(USERS_FILE, "rb") as f:
+                users_db.update(_users_adapter.validate_json(f.read()))
+        except Exception as e:
+            logger.error("Error loading users data: %s", e)
+
+def write_json_file(path: str, payload: bytes) -> None:
+    """Atomically replaces the file at path with payload."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+# Held while users.json is written, so a write left running in a worker thread
+# never races the final save at shutdown over the temp file.
+_users_write_lock = threading.Lock()
+
+def serialize_users() -> bytes:
+    return _users_adapter.dump_json(users_db)
+
+def write_users(payload: bytes) -> None:
+    """Writes serialized user data to the users file."""
+    with _users_write_lock:
+        try:
+            write_json_file(USERS_FILE, payload)
+            logger.info("Users data saved successfully.")
         except Exception as e:
-            print(f"{Fore.RED}Error loading users data: {e}{Style.RESET_ALL}")
+            logger.error("Error saving users data: %s", e)
 
 def save_users() -> None:
     """Saves user data to a JSON file."""
-    try:
-        with open(USERS_FILE, "w") as f:
-            serializable_users = {key: user.model_dump() for key, user in users_db.items()}
-            json.dump(serializable_users, f, indent=4)
-        print(f"{Fore.GREEN}INFO: Users data saved successfully.{Style.RESET_ALL}")
-    except Exception as e:
-        print(f"{Fore.RED}Error saving users data: {e}{Style.RESET_ALL}")
+    write_users(serialize_users())
 
 def create_initial_user() -> None:
     """Creates a default user for testing if none exist."""
@@ -75,7 +108,7 @@ def create_initial_user() -> None:
         new_user = UserInDB(username=default_username, hashed_password=hashed_password)
         users_db[default_username] = new_user
         save_users()
-        print(f"{Fore.YELLOW}INFO: Default user '{default_username}' created with password '{default_password}'.{Style.RESET_ALL}")
+        logger.warning("Default user '%s' created with password '%s'.", default_username, default_password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Checks a plain password against a hashed one."""
@@ -96,7 +129,31 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
+# Recently verified tokens -> (cached_until, username), so repeat requests skip jwt.decode.
+# cached_until never passes the token's own expiry. Only the username is cached, and the
+# user is still looked up on every request, so a removed user is rejected straight away.
+_token_cache: Dict[str, tuple[float, str]] = {}
+
+def _decode_username(token: str) -> Optional[str]:
+    """Returns the token's subject, decoding it only if it isn't cached. None if it's invalid."""
+    now = time.time()
+    cached = _token_cache.get(token)
+    if cached and cached[0] > now:
+        return cached[1]
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    username = payload.get("sub")
+    if username is None:
+        return None
+    if token not in _token_cache and len(_token_cache) >= TOKEN_CACHE_MAX_SIZE:
+        del _token_cache[next(iter(_token_cache))]
+    cached_until = now + TOKEN_CACHE_TTL_SECONDS
+    _token_cache[token] = (min(cached_until, payload.get("exp", cached_until)), username)
+    return username
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
     """
     Dependency to get the authenticated user from a JWT token.
     Raises an HTTPException if the token is invalid or expired.
@@ -106,14 +163,11 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        user = get_user(username)
-        if user is None:
-            raise credentials_exception
-    except JWTError:
+    # Runs on the event loop, which keeps the cache free of cross-thread access.
+    username = _decode_username(token)
+    if username is None:
+        raise credentials_exception
+    user = get_user(username)
+    if user is None:
         raise credentials_exception
     return user
\ No newline at end of file
@@ -1,13 +1,19 @@
 # main.py
 
 from fastapi import FastAPI, HTTPException, status, Depends, Body
-from pydantic import BaseModel, Field
-from typing import List, Dict
+from fastapi.responses import ORJSONResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Any, List, Dict, Optional
 from datetime import datetime, timedelta, timezone
-import json
+import asyncio
+import logging
 import os
-import uuid
-from colorama import init, Fore, Style
+import secrets
+import sys
+import threading
+import orjson
+from colorama import Fore, Style, init
 
 # Import authentication functions and models from auth.py
 from auth import (
@@ -22,19 +28,33 @@ from auth import (
     pwd_context,
     get_user,
     save_users,
+    serialize_users,
+    write_users,
+    write_json_file,
     users_db,
     UserRegister
 )
 from fastapi.security import OAuth2PasswordRequestForm
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+
+# Shared with auth.py; handlers are attached in lifespan.
+logger = logging.getLogger("notes")
 
 # --- Constants ---
+NOTES_DIR = "notes"
+# Single file that held every user's notes before they were split per user; migrated on startup.
 NOTES_FILE = "notes.json"
+# Note changes not yet written to the per-user note files, one JSON record per line.
+NOTES_LOG_FILE = "notes.log"
+# How long the flush worker waits for more changes before appending them to the log.
+SAVE_DEBOUNCE_SECONDS = 0.5
+# Once the change log grows past this, it is folded into the note files and emptied.
+NOTES_LOG_COMPACT_BYTES = 1_000_000
 
 # --- Models ---
 class Note(BaseModel):
     """Pydantic model for a single note."""
-    note_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    note_id: str = Field(default_factory=lambda: secrets.token_hex(8))
     title: str
     content: str
     date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -50,35 +70,243 @@ class NoteUpdate(BaseModel):
     content: str | None = None
 
 
-# In-memory database for notes, structured by username
-notes_db: Dict[str, List[Note]] = {}
+# Built once and reused, so a file is validated or dumped in one pydantic-core call.
+# The old notes.json held lists of notes per user before they were keyed by ID.
+_notes_file_adapter = TypeAdapter(Dict[str, Dict[str, Note] | List[Note]])
+_user_notes_adapter = TypeAdapter(Dict[str, Note])
+
+# In-memory database for notes, structured by username and then note ID.
+# A user's notes are read from their file the first time they're needed.
+notes_db: Dict[str, Dict[str, Note]] = {}
+# Users whose notes changed since their file was last written.
+_dirty_users: set[str] = set()
 
 # --- Utility Functions for Data Persistence ---
-def load_notes() -> None:
-    """Loads notes data from a JSON file."""
-    global notes_db
+def user_notes_file(username: str) -> str:
+    """Path of a user's note file; the hex name is safe for any username."""
+    return os.path.join(NOTES_DIR, username.encode().hex() + ".json")
+
+def read_user_notes(username: str) -> Dict[str, Note]:
+    """Reads a user's notes from their file, or returns no notes if they have none yet."""
+    path = user_notes_file(username)
+    if os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                # Also converts date strings back to datetime objects
+                return _user_notes_adapter.validate_json(f.read())
+        except Exception as e:
+            logger.error("Error loading notes for '%s': %s", username, e)
+    return {}
+
+def get_user_notes(username: str) -> Dict[str, Note]:
+    """Returns a user's notes, loading them from their file on first access."""
+    notes = notes_db.get(username)
+    if notes is None:
+        notes = notes_db[username] = read_user_notes(username)
+    return notes
+
+async def fetch_user_notes(username: str) -> Dict[str, Note]:
+    """Like get_user_notes, but reads a not-yet-loaded user's file off the event loop."""
+    notes = notes_db.get(username)
+    if notes is None:
+        notes = await asyncio.to_thread(read_user_notes, username)
+        # Another request may have loaded (and changed) them while this one waited.
+        notes = notes_db.setdefault(username, notes)
+    return notes
+
+def apply_note_record(record: Dict[str, Any]) -> None:
+    """Replays one change log record onto notes_db."""
+    user_notes = get_user_notes(record["user"])
+    if record["op"] == "put":
+        note = Note(**record["note"])
+        user_notes[note.note_id] = note
+    else:
+        user_notes.pop(record["note_id"], None)
+    _dirty_users.add(record["user"])
+
+def migrate_notes_file() -> None:
+    """Splits the old single notes file into per-user files, then removes it."""
+    with open(NOTES_FILE, "rb") as f:
+        data = _notes_file_adapter.validate_json(f.read())
+    os.makedirs(NOTES_DIR, exist_ok=True)
+    for username, notes in data.items():
+        if isinstance(notes, list):
+            # Saved before notes were keyed by ID
+            notes = {note.note_id: note for note in notes}
+        write_json_file(user_notes_file(username), _user_notes_adapter.dump_json(notes))
+    # Only removed once every user's file is written, so a crash here just migrates again.
+    os.remove(NOTES_FILE)
+    logger.info("Migrated notes data from %s.", NOTES_FILE)
+
+# Set while an old notes.json is still waiting to be migrated. Until then the change log is
+# never emptied: a later migration overwrites the note files, and the log re-applies every
+# change made since on top.
+_migration_pending = False
+
+def recover_notes() -> None:
+    """Migrates the old notes file if present, then replays any change log left by a crash."""
+    global _migration_pending
     if os.path.exists(NOTES_FILE):
         try:
-            with open(NOTES_FILE, "r") as f:
-                data = json.load(f)
-                # Convert date strings back to datetime objects
-                for username, notes in data.items():
-                    notes_db[username] = [Note(**note) for note in notes]
+            migrate_notes_file()
+        except Exception as e:
+            logger.error("Error migrating notes data, will retry on next start: %s", e)
+    _migration_pending = os.path.exists(NOTES_FILE)
+    if os.path.exists(NOTES_LOG_FILE):
+        with open(NOTES_LOG_FILE, "rb") as f:
+            for line in f:
+                try:
+                    apply_note_record(orjson.loads(line))
+                except orjson.JSONDecodeError:
+                    # A line torn by a crash mid-write
+                    logger.error("Skipping unreadable change log entry.")
+
+def take_dirty_notes() -> List[tuple[str, bytes]]:
+    """Serializes the notes of every changed user and clears their dirty flags."""
+    # One adapter call per file, instead of a model_dump() per note.
+    payloads = [
+        (username, _user_notes_adapter.dump_json(notes_db[username])) for username in _dirty_users
+    ]
+    _dirty_users.clear()
+    return payloads
+
+# Held around file writes, so a write still running in a worker thread when shutdown
+# cancels the flush worker finishes before the final compaction touches the files.
+_save_lock = threading.Lock()
+# The change log stays open once written to, so an append is a single write() call.
+_notes_log_fd: Optional[int] = None
+_notes_log_size = 0
+
+def open_notes_log() -> None:
+    global _notes_log_fd, _notes_log_size
+    # O_APPEND makes each write land at the end of the file, even right after a truncate.
+    _notes_log_fd = os.open(NOTES_LOG_FILE, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+    _notes_log_size = os.fstat(_notes_log_fd).st_size
+    if _notes_log_size and os.pread(_notes_log_fd, 1, _notes_log_size - 1) != b"\n":
+        # Ends in a line torn by a crash; new records must not be glued onto it.
+        _notes_log_size += os.write(_notes_log_fd, b"\n")
+
+def close_notes_log() -> None:
+    global _notes_log_fd
+    with _save_lock:
+        if _notes_log_fd is not None:
+            os.close(_notes_log_fd)
+            _notes_log_fd = None
+
+def compact_notes(payloads: List[tuple[str, bytes]]) -> None:
+    """Writes the changed users' note files and then empties the change log they supersede."""
+    global _notes_log_size
+    with _save_lock:
+        try:
+            os.makedirs(NOTES_DIR, exist_ok=True)
+            for username, payload in payloads:
+                write_json_file(user_notes_file(username), payload)
+            logger.info("Notes data saved successfully.")
         except Exception as e:
-            print(f"{Fore.RED}Error loading notes data: {e}{Style.RESET_ALL}")
-
-def save_notes() -> None:
-    """Saves notes data to a JSON file."""
-    try:
-        with open(NOTES_FILE, "w") as f:
-            serializable_notes = {
-                username: [note.model_dump(mode='json') for note in notes]
-                for username, notes in notes_db.items()
-            }
-            json.dump(serializable_notes, f, indent=4)
-        print(f"{Fore.GREEN}INFO: Notes data saved successfully.{Style.RESET_ALL}")
-    except Exception as e:
-        print(f"{Fore.RED}Error saving notes data: {e}{Style.RESET_ALL}")
+            logger.error("Error saving notes data: %s", e)
+            # The log still holds these changes; write the files again next time.
+            _dirty_users.update(username for username, _ in payloads)
+            return
+        if _migration_pending:
+            return
+        if _notes_log_fd is None:
+            open(NOTES_LOG_FILE, "wb").close()
+        else:
+            os.ftruncate(_notes_log_fd, 0)
+        _notes_log_size = 0
+
+def append_records(data: bytes) -> int:
+    """Appends records to the change log and returns its new size (0 if the write failed)."""
+    global _notes_log_size
+    with _save_lock:
+        try:
+            if _notes_log_fd is None:
+                open_notes_log()
+            _notes_log_size += os.write(_notes_log_fd, data)
+            return _notes_log_size
+        except OSError as e:
+            logger.error("Error writing change log: %s", e)
+            return 0
+
+# Change log records not yet written, flushed together by the flush worker.
+_pending_records: List[bytes] = []
+# Set by mutating endpoints; the flush worker started in lifespan coalesces them into one write.
+_notes_dirty: Optional[asyncio.Event] = None
+# Set by registrations; the flush worker then rewrites users.json off the event loop.
+_users_changed = False
+
+def take_pending_records() -> bytes:
+    data = b"".join(record + b"\n" for record in _pending_records)
+    _pending_records.clear()
+    return data
+
+def write_pending_records() -> None:
+    """Appends buffered records to the change log, compacting it once it grows too large."""
+    data = take_pending_records()
+    if data and append_records(data) >= NOTES_LOG_COMPACT_BYTES:
+        compact_notes(take_dirty_notes())
+
+def log_note_record(record: Dict[str, Any]) -> None:
+    """Queues a change for the log; writes immediately if the flush worker isn't running."""
+    _pending_records.append(orjson.dumps(record))
+    _dirty_users.add(record["user"])
+    if _notes_dirty is None:
+        write_pending_records()
+    else:
+        _notes_dirty.set()
+
+def mark_users_dirty() -> None:
+    """Schedules a users.json write; writes immediately if the flush worker isn't running."""
+    global _users_changed
+    if _notes_dirty is None:
+        save_users()
+    else:
+        _users_changed = True
+        _notes_dirty.set()
+
+def log_note(username: str, note: Note) -> None:
+    """Records the current state of a user's note."""
+    log_note_record({"op": "put", "user": username, "note": note.model_dump()})
+
+def log_note_deleted(username: str, note_id: str) -> None:
+    log_note_record({"op": "delete", "user": username, "note_id": note_id})
+
+async def _flush_worker() -> None:
+    global _users_changed
+    while True:
+        await _notes_dirty.wait()
+        await asyncio.sleep(SAVE_DEBOUNCE_SECONDS)
+        _notes_dirty.clear()
+        if _users_changed:
+            _users_changed = False
+            # Serialized on the event loop so the thread never sees users_db mid-update.
+            await asyncio.to_thread(write_users, serialize_users())
+        # Taken on the event loop, so endpoints never append to a batch being written.
+        data = take_pending_records()
+        if data and await asyncio.to_thread(append_records, data) >= NOTES_LOG_COMPACT_BYTES:
+            # Serialized on the event loop so the files cover every record logged so far;
+            # records buffered meanwhile land after the truncate and replay harmlessly.
+            await asyncio.to_thread(compact_notes, take_dirty_notes())
+
+# --- Logging ---
+_LEVEL_COLORS = {logging.INFO: Fore.GREEN, logging.WARNING: Fore.YELLOW, logging.ERROR: Fore.RED}
+
+def _add_color(record: logging.LogRecord) -> bool:
+    record.color = _LEVEL_COLORS.get(record.levelno, "")
+    return True
+
+def setup_logging() -> None:
+    """Sends the notes logger to stderr, colored by level when stderr is a terminal."""
+    handler = logging.StreamHandler()
+    if sys.stderr.isatty():
+        init()
+        handler.addFilter(_add_color)
+        handler.setFormatter(logging.Formatter(f"%(color)s%(levelname)s: %(message)s{Style.RESET_ALL}"))
+    else:
+        handler.setFormatter(logging.Formatter("%(levelname)s: %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
 
 # --- FastAPI App Lifecycle ---
 @asynccontextmanager
@@ -87,18 +315,33 @@ async def lifespan(app: FastAPI):
     Function to run on app startup and shutdown.
     Loads data and creates a default user on startup.
     """
-    init() # Initialize colorama
-    print(f"{Fore.CYAN}Starting up...{Style.RESET_ALL}")
+    global _notes_dirty
+    setup_logging()
+    logger.info("Starting up...")
     load_users()
     create_initial_user()
-    load_notes()
+    # Migrating or replaying can touch many files; keep it off the event loop.
+    await asyncio.to_thread(recover_notes)
+    if os.path.exists(NOTES_LOG_FILE) and os.path.getsize(NOTES_LOG_FILE):
+        # Left over from a crash; fold it in now so new records never follow a torn line.
+        await asyncio.to_thread(compact_notes, take_dirty_notes())
+    open_notes_log()
+    _notes_dirty = asyncio.Event()
+    flush_task = asyncio.create_task(_flush_worker())
     yield
-    print(f"{Fore.CYAN}Shutting down...{Style.RESET_ALL}")
-    save_notes()
-    save_users()
+    logger.info("Shutting down...")
+    flush_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await flush_task
+    _notes_dirty = None
+    write_pending_records()
+    await asyncio.to_thread(compact_notes, take_dirty_notes())
+    close_notes_log()
+    await asyncio.to_thread(write_users, serialize_users())
+    logger.handlers.clear()
 
 
-app = FastAPI(title="Notes API with JWT Auth", lifespan=lifespan)
+app = FastAPI(title="Notes API with JWT Auth", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # --- Authentication Endpoints ---
 @app.post("/register/", status_code=status.HTTP_201_CREATED, summary="Register a new user")
@@ -109,17 +352,23 @@ async def register_user(user: UserRegister):
             status_code=status.HTTP_409_CONFLICT,
             detail="Username already registered"
         )
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await run_in_threadpool(pwd_context.hash, user.password)
+    if get_user(user.username):
+        # Registered by a concurrent request while we were hashing.
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Username already registered"
+        )
     new_user = UserInDB(username=user.username, hashed_password=hashed_password)
     users_db[user.username] = new_user
-    save_users()
+    mark_users_dirty()
     return {"message": "Registration successful"}
 
 @app.post("/login/", response_model=Token, summary="Login and get a JWT token")
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     """Logs in a user and returns a JWT access token."""
     user = get_user(form_data.username)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user or not await run_in_threadpool(verify_password, form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -143,12 +392,9 @@ async def add_note(
     """
     new_note = Note(title=note_create.title, content=note_create.content)
     
-    # Get or create the user's notes list
-    if current_user.username not in notes_db:
-        notes_db[current_user.username] = []
-    
-    notes_db[current_user.username].append(new_note)
-    save_notes()
+    user_notes = await fetch_user_notes(current_user.username)
+    user_notes[new_note.note_id] = new_note
+    log_note(current_user.username, new_note)
     
     return {"message": "Note added successfully", "note_id": new_note.note_id}
 
@@ -161,7 +407,8 @@ async def get_notes(
     Requires a valid JWT token in the Authorization header.
     """
     # Return the user's notes, or an empty list if they have none
-    return notes_db.get(current_user.username, [])
+    user_notes = await fetch_user_notes(current_user.username)
+    return list(user_notes.values())
 
 
 @app.get("/notes/{note_id}", response_model=Note, summary="View a single note by ID")
@@ -173,14 +420,14 @@ async def get_single_note(
     Retrieves a single note for the authenticated user by its ID.
     Raises 404 if the note is not found or does not belong to the user.
     """
-    user_notes = notes_db.get(current_user.username, [])
-    for note in user_notes:
-        if note.note_id == note_id:
-            return note
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail="Note not found."
-    )
+    user_notes = await fetch_user_notes(current_user.username)
+    note = user_notes.get(note_id)
+    if note is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note not found."
+        )
+    return note
 
 @app.put("/notes/{note_id}", response_model=Note, summary="Update an existing note")
 async def update_note(
@@ -192,20 +439,19 @@ async def update_note(
     Updates an existing note for the authenticated user.
     Raises 404 if the note is not found or does not belong to the user.
     """
-    user_notes = notes_db.get(current_user.username, [])
-    for i, note in enumerate(user_notes):
-        if note.note_id == note_id:
-            if note_update.title:
-                note.title = note_update.title
-            if note_update.content:
-                note.content = note_update.content
-            notes_db[current_user.username][i] = note
-            save_notes()
-            return note
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail="Note not found."
-    )
+    user_notes = await fetch_user_notes(current_user.username)
+    note = user_notes.get(note_id)
+    if note is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note not found."
+        )
+    if note_update.title:
+        note.title = note_update.title
+    if note_update.content:
+        note.content = note_update.content
+    log_note(current_user.username, note)
+    return note
 
 @app.delete("/notes/{note_id}", status_code=status.HTTP_204_NO_CONTENT, summary="Delete a note by ID")
 async def delete_note(
@@ -216,14 +462,11 @@ async def delete_note(
     Deletes a single note for the authenticated user by its ID.
     Raises 404 if the note is not found or does not belong to the user.
     """
-    user_notes = notes_db.get(current_user.username, [])
-    # Find the note index and remove it
-    for i, note in enumerate(user_notes):
-        if note.note_id == note_id:
-            del notes_db[current_user.username][i]
-            save_notes()
-            return
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail="Note not found."
-    )
\ No newline at end of file
+    user_notes = await fetch_user_notes(current_user.username)
+    if note_id not in user_notes:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note not found."
+        )
+    del user_notes[note_id]
+    log_note_deleted(current_user.username, note_id)
\ No newline at end of file